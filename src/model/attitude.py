@@ -0,0 +1,308 @@
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+"""
+Attitude of a satellite over time. Each Satellite holds a schedule, a list of
+(start, mode) pairs where every mode applies from its start (s elapsed since
+the epoch) until the start of the next one; samples before the first start use
+the first mode. Each mode is evaluated in one batch over all the samples of its
+intervals, and the result is cached as a single quaternion time series. As for
+the original nadir pointing, each quaternion is that of the direction cosine
+matrix from EME2000 to body, whose rows are the body axes (scalar last)
+
+All pointing modes share boresight_quats: the body z-axis points along a
+boresight and the body x-axis lies in the plane of the boresight and a
+reference direction (the velocity unless stated otherwise)
+"""
+
+"""
+Sine of the smallest angle between the boresight and the reference direction
+before the fallback reference is used instead
+"""
+PARALLEL_TOLERANCE = 1e-9
+
+"""
+Low precision solar ephemeris (Astronomical Almanac), about 0.01 deg over
+1950-2050, referred to the J2000 equinox and equator
+"""
+ASTRONOMICAL_UNIT = 149597870700.0
+J2000_OBLIQUITY = np.deg2rad(23.439291)
+GENERAL_PRECESSION = np.deg2rad(1.3969713) / 36525   # radian per day
+
+def boresight_quats(boresight, reference):
+    """
+    Quaternions aligning the body z-axis with a boresight and the body
+    x-axis with the component of a reference direction orthogonal to it,
+    for a whole array at once. Where the reference is parallel to the
+    boresight, the EME2000 z-axis (or x-axis) is used instead
+
+    Parameters
+    ----------
+    boresight : array
+        Boresight directions, shape (T, 3)
+    reference : array
+        Reference directions, shape (T, 3)
+
+    Returns
+    -------
+    quats : array
+        Array of attitude quaternions, shape (T, 4)
+    """
+    if len(boresight) == 0:
+        return np.zeros((0, 4))
+
+    b3_unit = boresight / np.linalg.norm(boresight, axis = 1, keepdims = True)
+
+    def orthogonal(ref):
+        along = np.einsum("ij,ij->i", ref, b3_unit)
+        return ref - along[:, None] * b3_unit
+
+    reference = np.broadcast_to(reference, b3_unit.shape)
+    b1 = orthogonal(reference)
+    norm = np.linalg.norm(b1, axis = 1)
+    parallel = norm <= PARALLEL_TOLERANCE * np.linalg.norm(reference, axis = 1)
+    if np.any(parallel):
+        # Any axis not along the boresight fixes the rotation about it
+        fallback = np.where(np.abs(b3_unit[:, 2:3]) < 0.9, [[0., 0., 1.]],
+                            [[1., 0., 0.]])
+        b1[parallel] = orthogonal(fallback)[parallel]
+        norm[parallel] = np.linalg.norm(b1[parallel], axis = 1)
+    b1_unit = b1 / norm[:, None]
+
+    b2_unit = np.cross(b3_unit, b1_unit)
+
+    # Direction cosine matrices from eci to body, whose rows are the body axes
+    DCM_b2e = np.stack([b1_unit, b2_unit, b3_unit], axis = 1)
+    return R.from_matrix(DCM_b2e).as_quat()
+
+def sun_positions(epoch, times):
+    """
+    Compute the position of the Sun in EME2000 for a whole time grid
+
+    Parameters
+    ----------
+    epoch : orekit.time.AbsoluteDate
+        Date of the first timestep
+    times : np.array
+        Array of timesteps (s)
+
+    Returns
+    -------
+    poses : array
+        Array of Sun positions (m, m, m)
+    """
+    from org.orekit.time import AbsoluteDate
+
+    days = (epoch.durationFrom(AbsoluteDate.J2000_EPOCH) + np.asarray(times)) / 86400
+
+    # Mean longitude and mean anomaly (radian), then ecliptic longitude
+    # referred to the J2000 equinox
+    L = np.deg2rad(280.460 + 0.9856474 * days)
+    g = np.deg2rad(357.528 + 0.9856003 * days)
+    lam = (L + np.deg2rad(1.915) * np.sin(g) + np.deg2rad(0.020) * np.sin(2 * g)
+           - GENERAL_PRECESSION * days)
+    dist = ASTRONOMICAL_UNIT * (1.00014 - 0.01671 * np.cos(g)
+                                - 0.00014 * np.cos(2 * g))
+
+    return dist[:, None] * np.column_stack([
+        np.cos(lam),
+        np.cos(J2000_OBLIQUITY) * np.sin(lam),
+        np.sin(J2000_OBLIQUITY) * np.sin(lam)])
+
+class AttitudeMode:
+    """
+    Base class of the pointing modes. Subclasses implement quats and, when
+    their attitude depends on anything other than the satellite's own state,
+    extend key so that cached quaternions are recomputed when it changes
+    """
+    def quats(self, sat, times, poses, vels):
+        """
+        Compute the attitude over a set of samples
+
+        Parameters
+        ----------
+        sat : satellite.Satellite
+            Satellite whose attitude is computed
+        times : np.array
+            Array of timesteps (s)
+        poses : array
+            Array of positions in 3D (m, m, m)
+        vels : array
+            Array of velocities in 3D (m s^-1, m s^-1, m s^-1)
+
+        Returns
+        -------
+        quats : array
+            Array of attitude quaternions, shape (T, 4)
+        """
+        raise NotImplementedError
+
+    def key(self):
+        """
+        Identify the mode and the state it depends on
+
+        Returns
+        -------
+        key : tuple
+            Hashable description of the mode
+        """
+        return (type(self).__name__,)
+
+class Nadir(AttitudeMode):
+    """
+    Body z-axis towards the centre of the Earth, x-axis along the velocity
+    """
+    def quats(self, sat, times, poses, vels):
+        return boresight_quats(-poses, vels)
+
+class TargetTracking(AttitudeMode):
+    def __init__(self, target):
+        """
+        Body z-axis towards another satellite, x-axis along the velocity
+
+        Parameters
+        ----------
+        target : satellite.Satellite
+            Satellite tracked
+
+        Returns
+        -------
+        """
+        self.target = target
+
+    def quats(self, sat, times, poses, vels):
+        if len(times) == 0:
+            return np.zeros((0, 4))
+        # The samples are partial grids (single modes, extensions), so the
+        # target is propagated without filling its cache, at the same dates
+        # even if its epoch differs
+        offset = sat.epoch.durationFrom(self.target.epoch)
+        target_poses, _ = self.target._compute_pv(np.asarray(times) + offset)
+        return boresight_quats(target_poses - poses, vels)
+
+    def key(self):
+        return (type(self).__name__, id(self.target), self.target._version)
+
+class SunPointing(AttitudeMode):
+    """
+    Body z-axis towards the Sun, x-axis along the velocity
+    """
+    def quats(self, sat, times, poses, vels):
+        return boresight_quats(sun_positions(sat.epoch, times) - poses, vels)
+
+class Inertial(AttitudeMode):
+    def __init__(self, quat = (0.0, 0.0, 0.0, 1.0)):
+        """
+        Attitude fixed in EME2000
+
+        Parameters
+        ----------
+        quat = (0, 0, 0, 1) : array
+            Attitude quaternion (direction cosine matrix from EME2000 to
+            body, scalar last)
+
+        Returns
+        -------
+        """
+        self.quat = R.from_quat(quat).as_quat()
+
+    def quats(self, sat, times, poses, vels):
+        return np.tile(self.quat, (len(times), 1))
+
+    def key(self):
+        return (type(self).__name__, tuple(self.quat))
+
+def as_schedule(schedule):
+    """
+    Validate an attitude schedule
+
+    Parameters
+    ----------
+    schedule : AttitudeMode or list
+        Single mode, or list of (start, mode) pairs (s, AttitudeMode)
+
+    Returns
+    -------
+    schedule : list
+        List of (start, mode) pairs sorted by start
+    """
+    if isinstance(schedule, AttitudeMode):
+        return [(0.0, schedule)]
+
+    schedule = sorted(((float(start), mode) for start, mode in schedule),
+                      key = lambda item: item[0])
+    if not schedule:
+        raise ValueError("An attitude schedule needs at least one mode")
+    for _, mode in schedule:
+        if not isinstance(mode, AttitudeMode):
+            raise TypeError(f"Unknown attitude mode: {mode!r}")
+    return schedule
+
+def schedule_key(schedule):
+    """
+    Identify a schedule and the state its modes depend on, used to tell
+    whether cached quaternions are still valid
+
+    Parameters
+    ----------
+    schedule : list
+        List of (start, mode) pairs
+
+    Returns
+    -------
+    key : tuple
+        Hashable description of the schedule
+    """
+    return tuple((start, mode.key()) for start, mode in schedule)
+
+def is_nadir(schedule):
+    """
+    Whether a schedule only uses nadir pointing, whose attitude only depends
+    on the satellite's own position and velocity
+
+    Parameters
+    ----------
+    schedule : list
+        List of (start, mode) pairs
+
+    Returns
+    -------
+    nadir : bool
+        True for nadir only schedules
+    """
+    return all(isinstance(mode, Nadir) for _, mode in schedule)
+
+def evaluate(schedule, sat, times, poses, vels):
+    """
+    Compute the attitude of a satellite following a schedule, each mode
+    being evaluated once over all its samples
+
+    Parameters
+    ----------
+    schedule : list
+        List of (start, mode) pairs sorted by start
+    sat : satellite.Satellite
+        Satellite whose attitude is computed
+    times : np.array
+        Array of timesteps (s)
+    poses : array
+        Array of positions in 3D (m, m, m)
+    vels : array
+        Array of velocities in 3D (m s^-1, m s^-1, m s^-1)
+
+    Returns
+    -------
+    quats : array
+        Array of attitude quaternions, shape (T, 4)
+    """
+    starts = np.array([start for start, _ in schedule])
+    active = np.clip(np.searchsorted(starts, times, side = "right") - 1, 0, None)
+
+    if len(schedule) == 1:
+        return schedule[0][1].quats(sat, times, poses, vels)
+
+    quats = np.empty((len(times), 4))
+    for k in np.unique(active):
+        mask = active == k
+        quats[mask] = schedule[k][1].quats(sat, times[mask], poses[mask], vels[mask])
+    return quats
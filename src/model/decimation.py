@@ -0,0 +1,230 @@
+import numpy as np
+
+"""
+Ground tracks are decimated with the Douglas-Peucker algorithm, run once down
+to LOD_MIN_TOLERANCE (deg). Every vertex records the largest tolerance at
+which it is still kept, so the track can then be extracted at any coarser
+tolerance by a simple threshold. Levels of detail are the tolerances of
+LOD_TOLERANCES, each extracted once and cached; below the finest level every
+vertex is kept
+"""
+LOD_MIN_TOLERANCE = 1e-4
+LOD_TOLERANCES = tuple(float(tol) for tol in 4.0**-np.arange(0, 7))
+
+"""
+Tolerance of a view, as a fraction of the size of one screen pixel
+"""
+LOD_PIXEL_FRACTION = 0.5
+
+def douglas_peucker(points, min_tolerance = LOD_MIN_TOLERANCE):
+    """
+    Compute the Douglas-Peucker significance of every vertex of a polyline.
+    All the open intervals of one recursion depth are split at once, so the
+    Python loop only runs once per depth. NaN rows (breaks between parts of
+    a ground track) and the vertices around them are always kept
+
+    Parameters
+    ----------
+    points : array
+        Polyline vertices, shape (T, 2)
+    min_tolerance = LOD_MIN_TOLERANCE : float
+        Tolerance below which intervals are not split any further
+
+    Returns
+    -------
+    significance : array
+        Largest tolerance at which each vertex is kept, shape (T,). Vertices
+        which are always kept have infinite significance and vertices below
+        min_tolerance have zero significance
+    """
+    n = len(points)
+    significance = np.zeros(n)
+    if n == 0:
+        return significance
+
+    # Vertices kept at any tolerance: both ends of the polyline and of
+    # every part between NaN breaks
+    gaps = np.isnan(points).any(axis = 1)
+    forced = gaps.copy()
+    forced[[0, -1]] = True
+    forced[:-1] |= gaps[1:]
+    forced[1:] |= gaps[:-1]
+    significance[forced] = np.inf
+
+    anchors = np.flatnonzero(forced)
+    starts, ends = anchors[:-1], anchors[1:]
+    valid = ~gaps[starts] & ~gaps[ends] & (ends - starts > 1)
+    starts, ends = starts[valid], ends[valid]
+    # Smallest split distance among the ancestors of each interval
+    bounds = np.full(len(starts), np.inf)
+
+    while len(starts):
+        # Interior vertices of every interval, flattened
+        counts = ends - starts - 1
+        offsets = np.r_[0, np.cumsum(counts)[:-1]]
+        owner = np.repeat(np.arange(len(starts)), counts)
+        idx = starts[owner] + np.arange(counts.sum()) - offsets[owner] + 1
+
+        # Distance from each vertex to the chord of its interval
+        a, b = points[starts[owner]], points[ends[owner]]
+        chord = b - a
+        length2 = np.einsum("ij,ij->i", chord, chord)
+        along = np.einsum("ij,ij->i", points[idx] - a, chord)
+        along = np.clip(np.divide(along, length2, out = np.zeros_like(along),
+                                  where = length2 > 0), 0, 1)
+        dist = np.linalg.norm(points[idx] - a - along[:, None] * chord, axis = 1)
+
+        # Farthest vertex of each interval, the first one on ties
+        dmax = np.maximum.reduceat(dist, offsets)
+        first = np.flatnonzero(dist == dmax[owner])
+        _, pick = np.unique(owner[first], return_index = True)
+        split = idx[first[pick]]
+
+        refine = dmax > min_tolerance
+        split, dmax = split[refine], dmax[refine]
+        bounds = np.minimum(bounds[refine], dmax)
+        significance[split] = bounds
+
+        starts, ends = starts[refine], ends[refine]
+        starts, ends = np.r_[starts, split], np.r_[split, ends]
+        bounds = np.r_[bounds, bounds]
+        longer = ends - starts > 1
+        starts, ends, bounds = starts[longer], ends[longer], bounds[longer]
+
+    return significance
+
+def level_tolerance(tolerance):
+    """
+    Pick the level of detail serving a requested tolerance
+
+    Parameters
+    ----------
+    tolerance : float
+        Largest acceptable deviation from the full track (deg)
+
+    Returns
+    -------
+    level : float
+        Largest tolerance of LOD_TOLERANCES not above the request, 0 (every
+        vertex) when the request is below all of them
+    """
+    for level in LOD_TOLERANCES:
+        if level <= tolerance:
+            return level
+    return 0.0
+
+class TrackPyramid:
+    def __init__(self, gtc, min_tolerance = LOD_MIN_TOLERANCE, shared = False):
+        """
+        Multi-resolution view of a ground track. The Douglas-Peucker pass
+        runs once, and the vertices of each level of detail are extracted
+        from it on first use and cached
+
+        Parameters
+        ----------
+        gtc : array
+            Array of ground track positions (deg, deg), as returned by
+            Satellite.get_gtc
+        min_tolerance = LOD_MIN_TOLERANCE : float
+            Finest tolerance resolved by the pyramid (deg)
+        shared = False : bool
+            Whether gtc is held (and counted) elsewhere, e.g. the cached
+            ground track of the satellite, rather than owned by the pyramid
+
+        Returns
+        -------
+        """
+        self.gtc = gtc
+        self.shared = shared
+        self.significance = douglas_peucker(gtc, min_tolerance).astype(np.float32)
+        self._levels = {}
+
+    @property
+    def nbytes(self):
+        track = 0 if self.shared else self.gtc.nbytes
+        return (track + self.significance.nbytes
+                + sum(idx.nbytes for idx in self._levels.values()))
+
+    def indices(self, tolerance):
+        """
+        Indices of the vertices kept at a tolerance
+
+        Parameters
+        ----------
+        tolerance : float
+            Largest acceptable deviation from the full track (deg)
+
+        Returns
+        -------
+        idx : array
+            Sorted indices into the ground track
+        """
+        level = level_tolerance(tolerance)
+        if level not in self._levels:
+            if level == 0:
+                self._levels[level] = np.arange(len(self.gtc))
+            else:
+                self._levels[level] = np.flatnonzero(self.significance > level)
+        return self._levels[level]
+
+    def points(self, tolerance, xlim = None):
+        """
+        Ground track decimated to a tolerance, optionally restricted to a
+        range of longitudes
+
+        Parameters
+        ----------
+        tolerance : float
+            Largest acceptable deviation from the full track (deg)
+        xlim = None : tuple
+            (min, max) longitudes in view (deg). The vertices just outside
+            the range are kept so that lines still reach the view's edges
+
+        Returns
+        -------
+        gtc : array
+            Array of ground track positions (deg, deg)
+        """
+        idx = self.indices(tolerance)
+        if xlim is not None and len(idx):
+            lon = self.gtc[idx, 0]
+            inside = (lon >= xlim[0]) & (lon <= xlim[1])
+            near = inside.copy()
+            near[:-1] |= inside[1:]
+            near[1:] |= inside[:-1]
+            # Keep the breaks, so that separate parts are not joined
+            near |= np.isnan(lon)
+            keep = np.flatnonzero(near)
+            # Break the track where vertices out of view were skipped
+            jumps = np.flatnonzero(np.diff(keep) > 1) + 1
+            return np.insert(self.gtc[idx[keep]], jumps, np.nan, axis = 0)
+        return self.gtc[idx]
+
+def view_tolerance(ax):
+    """
+    Tolerance matching the current zoom of a ground track plot
+
+    Parameters
+    ----------
+    ax : axes._axes.Axes
+        Ground track axes
+
+    Returns
+    -------
+    tolerance : float
+        LOD_PIXEL_FRACTION of the size of one pixel (deg)
+    """
+    x0, x1 = ax.get_xlim()
+    y0, y1 = ax.get_ylim()
+    width, height = max(ax.bbox.width, 1), max(ax.bbox.height, 1)
+    pixel = min(abs(x1 - x0) / width, abs(y1 - y0) / height)
+    return LOD_PIXEL_FRACTION * pixel
+
+class TrackPyramids(dict):
+    """
+    Pyramids of one ground track for several central meridians, keyed by
+    meridian (deg). Counts the memory of all of them for the product caches
+    """
+    @property
+    def nbytes(self):
+        return sum(pyramid.nbytes for pyramid in self.values())
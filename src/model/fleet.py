@@ -0,0 +1,410 @@
+import numpy as np
+import src.model.kepler as kepler
+import src.model.frames as frames
+from src.model.frames import WGS84_EARTH_MU
+from src.model.satellite import Satellite, EARTH_J2, EARTH_J2_RADIUS
+
+"""
+Satellites whose propagation_mode is listed here are propagated together as a
+single (N, T, 3) tensor, any other satellite falls back to its own propagate.
+Earth-fixed and geodetic products are then derived for the whole tensor at
+once, with a single rotation stack per epoch shared by the fleet, and the
+member satellites are seeded with their slices
+"""
+VECTORIZED_MODES = ("numpy", "j2")
+
+class SatelliteFleet:
+    def __init__(self, sats):
+        """
+        Initialization function for the satellite fleet class. A fleet wraps
+        a list of Satellite objects, keeps their elements as arrays and
+        propagates all of them at once. It can be indexed and iterated like a
+        list, so it is accepted wherever a list of satellites is.
+
+        Parameters
+        ----------
+        sats : satellite.Satellite array
+            Array of Satellite objects
+
+        Returns
+        -------
+        """
+        self.sats = list(sats)
+
+        # Initialize caches to empty
+        self._cache_key = None
+        self._cache_times = None
+        self._cache_poses = None
+        self._cache_vels = None
+        # Derived (N, T, 3) products of the cached grid, e.g. "ecef", and the
+        # frames.frame_generation they were built with
+        self._cache_products = {}
+        self._cache_frame_key = None
+        
+        # Element arrays of shape (N, 1) per vectorized mode, rebuilt only
+        # when a member changes
+        self._elements_key = None
+        self._elements = {}
+
+    @classmethod
+    def from_elements(cls, a, e, i, omega, raan, anomaly, date, anomaly_type,
+                      labels = None, propagation_mode = "numpy"):
+        """
+        Build a fleet from arrays of Keplerian elements sharing one epoch
+
+        Parameters
+        ----------
+        a : array
+            Semi-major axes (m).
+        e : array
+            Eccentricities - dimensionless.
+        i : array
+            Inclinations (deg).
+        omega : array
+            Arguments of periapsis (deg).
+        raan : array
+            Right ascensions of the ascending node (deg).
+        anomaly : array
+            Anomalies (deg).
+        date : array
+            [year, month, day, hour, minute, second].
+        anomaly_type : str or array
+            Type of anomaly being used (TRUE, ECCENTRIC, MEAN)
+        labels = None : str array
+            Names of satellites, "Sat n" if not given
+        propagation_mode = "numpy" : str
+            Propagation backend of every satellite in the fleet
+
+        Returns
+        -------
+        fleet : SatelliteFleet
+            Fleet containing one Satellite per set of elements
+        """
+        a, e, i, omega, raan, anomaly = np.broadcast_arrays(a, e, i, omega,
+                                                            raan, anomaly)
+        anomaly_types = np.broadcast_to(np.asarray(anomaly_type), a.shape)
+        if labels is None:
+            labels = [f"Sat {n + 1}" for n in range(len(a))]
+
+        sats = [Satellite(a[n], e[n], i[n], omega[n], raan[n], anomaly[n], date,
+                          str(anomaly_types[n]), label = labels[n],
+                          propagation_mode = propagation_mode)
+                for n in range(len(a))]
+        return cls(sats)
+
+    def __len__(self):
+        return len(self.sats)
+
+    def __getitem__(self, idx):
+        return self.sats[idx]
+
+    def __iter__(self):
+        return iter(self.sats)
+
+    def _key(self):
+        """
+        Key identifying the current state of every member of the fleet
+
+        Returns
+        -------
+        key : tuple
+            ((id, version), ...) for each satellite
+        """
+        return tuple((id(sat), sat._version) for sat in self.sats)
+
+    def _element_arrays(self):
+        """
+        Gather the elements of the members propagated together, as (N, 1)
+        arrays which broadcast against the times
+        
+        Returns
+        -------
+        elements : dict
+            {mode: (member indices, a, e, i, omega, raan, M0)} for each mode
+            of VECTORIZED_MODES used in the fleet
+        """
+        key = self._key()
+        if self._elements_key != key:
+            self._elements = {}
+            for mode in VECTORIZED_MODES:
+                mode_idx = [n for n, sat in enumerate(self.sats)
+                            if sat.propagation_mode == mode]
+                if not mode_idx:
+                    continue
+                members = [self.sats[n] for n in mode_idx]
+                self._elements[mode] = (
+                    mode_idx,
+                    np.array([[sat.a] for sat in members]),
+                    np.array([[sat.e] for sat in members]),
+                    np.array([[sat.i] for sat in members]),
+                    np.array([[sat.omega] for sat in members]),
+                    np.array([[sat.raan] for sat in members]),
+                    np.array([[kepler.mean_anomaly(sat.anomaly, sat.e,
+                                                   sat.anomaly_type)]
+                              for sat in members]))
+            self._elements_key = key
+        return self._elements
+
+    def _epoch_groups(self):
+        """
+        Group the members sharing an epoch, which share their rotation stacks
+        
+        Returns
+        -------
+        groups : list
+            [(epoch, member indices), ...]
+        """
+        from org.orekit.time import AbsoluteDate
+        
+        groups = {}
+        for n, sat in enumerate(self.sats):
+            offset = sat.epoch.durationFrom(AbsoluteDate.J2000_EPOCH)
+            groups.setdefault(offset, (sat.epoch, []))[1].append(n)
+        return list(groups.values())
+
+    def _derived(self, times, name):
+        """
+        Compute a derived product of the whole fleet in one batch, and seed
+        the member satellites with their slices
+        
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+        name : str
+            "ecef", "ecef_vels", "lla" or "poses_<frame>"
+        
+        Returns
+        -------
+        product : array
+            Product of every satellite, shape (N, T, 3)
+        """
+        self.propagate(times)
+        if self._cache_frame_key != frames.frame_generation():
+            # Built from rotation stacks of older frame settings
+            self._cache_products = {}
+            self._cache_frame_key = frames.frame_generation()
+        if name in self._cache_products:
+            return self._cache_products[name]
+        
+        if name == "lla":
+            # Geodetic coordinates of the flattened tensor in one call
+            ecef = self._derived(times, "ecef")
+            product = frames.ecef_to_lla(ecef.reshape(-1, 3)).reshape(ecef.shape)
+        else:
+            product = np.empty_like(self._cache_poses)
+            for epoch, idx in self._epoch_groups():
+                if name == "ecef":
+                    rotations = frames.rotation_stack(epoch, times)
+                    product[idx] = np.einsum("tij,ntj->nti", rotations,
+                                             self._cache_poses[idx])
+                elif name == "ecef_vels":
+                    # Rotated velocities minus the transport term of the
+                    # Earth's rotation
+                    rotations = frames.rotation_stack(epoch, times)
+                    rates = frames.rotation_rate_stack(epoch, times)
+                    ecef = self._derived(times, "ecef")[idx]
+                    product[idx] = (np.einsum("tij,ntj->nti", rotations,
+                                              self._cache_vels[idx])
+                                    - np.cross(rates, ecef))
+                else:
+                    frame = name[len("poses_"):].upper()
+                    rotations = frames.frame_rotation_stack(epoch, times, frame)
+                    product[idx] = np.einsum("tij,ntj->nti", rotations,
+                                             self._cache_poses[idx])
+        
+        # Members share the fleet tensor instead of copying it
+        for n, sat in enumerate(self.sats):
+            sat._seed_product(times, name, product[n])
+        self._cache_products[name] = product
+        return product
+
+    def propagate(self, times):
+        """
+        Propagate every satellite of the fleet across time in one pass and
+        fill the caches of the member satellites with their slices
+
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+
+        Returns
+        -------
+        _cache_poses : array
+            Array of positions, shape (N, T, 3) (m, m, m)
+        """
+        key = self._key()
+        if (self._cache_key != key or self._cache_times is None
+            or not np.array_equal(times, self._cache_times)):
+
+            poses = np.zeros((len(self.sats), len(times), 3))
+            vels = np.zeros((len(self.sats), len(times), 3))
+
+            vector_idx = set()
+            for mode, elements in self._element_arrays().items():
+                mode_idx, a, e, i, omega, raan, M0 = elements
+                vector_idx.update(mode_idx)
+
+                if mode == "j2":
+                    poses[mode_idx], vels[mode_idx] = kepler.propagate_j2(
+                        a, e, i, omega, raan, M0, "MEAN",
+                        WGS84_EARTH_MU, EARTH_J2, EARTH_J2_RADIUS,
+                        times)
+                else:
+                    poses[mode_idx], vels[mode_idx] = kepler.propagate_kepler(
+                        a, e, i, omega, raan, M0, "MEAN",
+                        WGS84_EARTH_MU, times)
+
+            for n, sat in enumerate(self.sats):
+                if n in vector_idx:
+                    # Members share the fleet buffers instead of copying them
+                    sat._seed_pv(times, poses[n], vels[n])
+                else:
+                    poses[n] = sat.propagate(times)
+                    vels[n] = sat.get_vels(times)
+
+            self._cache_key = key
+            self._cache_times = times.copy()
+            self._cache_poses = poses
+            self._cache_vels = vels
+            self._cache_products = {}
+
+        return self._cache_poses
+
+    def get_vels(self, times):
+        """
+        Retrieve the velocities of every satellite across time
+
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+
+        Returns
+        -------
+        _cache_vels : array
+            Array of velocities, shape (N, T, 3) (m s^-1, m s^-1, m s^-1)
+        """
+        self.propagate(times)
+        return self._cache_vels
+
+    def get_ecef(self, times):
+        """
+        Retrieve ECEF positions of every satellite over time
+
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+
+        Returns
+        -------
+        ecef : array
+            Array of ECEF positions, shape (N, T, 3) (m, m, m)
+        """
+        return self._derived(times, "ecef")
+
+    def get_positions(self, times, frame = "EME2000"):
+        """
+        Retrieve positions of every satellite over time in one of the
+        supported frames
+
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+        frame = "EME2000" : str
+            Output frame, one of frames.OUTPUT_FRAMES
+
+        Returns
+        -------
+        poses : array
+            Array of positions, shape (N, T, 3) (m, m, m)
+        """
+        if frame not in frames.OUTPUT_FRAMES:
+            raise ValueError(f"Unknown output frame: {frame}")
+        if frame == "EME2000":
+            return self.propagate(times)
+        if frame == "ITRF":
+            return self._derived(times, "ecef")
+        return self._derived(times, f"poses_{frame.lower()}")
+
+    def get_ecef_pv(self, times):
+        """
+        Retrieve ECEF positions and velocities of every satellite over time
+
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+
+        Returns
+        -------
+        ecef : array
+            Array of ECEF positions, shape (N, T, 3) (m, m, m)
+        ecef_vels : array
+            Array of ECEF velocities, shape (N, T, 3) (m s^-1, m s^-1, m s^-1)
+        """
+        return self._derived(times, "ecef"), self._derived(times, "ecef_vels")
+
+    def get_lla(self, times):
+        """
+        Retrieve lla positions of every satellite over time
+
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+
+        Returns
+        -------
+        lla : array
+            Array of latitude, longitude, altitude, shape (N, T, 3)
+            (deg, deg, m)
+        """
+        return self._derived(times, "lla")
+
+    def get_gtc(self, times, central_meridian = 0.0):
+        """
+        Retrieve ground track positions of every satellite over time
+
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+        central_meridian = 0.0 : float
+            Longitude at the centre of the map (deg)
+
+        Returns
+        -------
+        gtc : list
+            List of ground track arrays (deg, deg), one per satellite. Their
+            lengths differ because of the breaks inserted at the antimeridian
+        """
+        # Breaks differ between satellites, so only the geodetic coordinates
+        # are computed for the whole fleet
+        self._derived(times, "lla")
+        return [sat.get_gtc(times, central_meridian) for sat in self.sats]
+
+def as_satellites(sats, times):
+    """
+    Accept either a list of satellites or a SatelliteFleet, propagating a
+    fleet in a single pass before its members are used one by one
+
+    Parameters
+    ----------
+    sats : satellite.Satellite array or SatelliteFleet
+        Satellites considered
+    times : np.array
+        Array of timesteps (s)
+
+    Returns
+    -------
+    sats : satellite.Satellite array
+        Array of Satellite objects
+    """
+    if isinstance(sats, SatelliteFleet):
+        sats.propagate(times)
+        return sats.sats
+    return sats
@@ -0,0 +1,974 @@
+import os
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+from scipy.spatial.transform import Rotation as R, Slerp
+from src.model.orekit_env import ensure_vm, data_source, check_eop_coverage
+from src.model.product_cache import grid_key
+
+"""
+WGS84 constants, equal to Orekit's Constants.WGS84_* and repeated here so
+that they can be used before the Orekit virtual machine is started
+"""
+WGS84_EARTH_MU = 3.986004418e14                 # m^3 s^-2
+WGS84_EARTH_EQUATORIAL_RADIUS = 6378137.0       # m
+WGS84_EARTH_FLATTENING = 1 / 298.257223563
+
+"""
+Frames of reference and the elliptical model of the Earth are built on first
+use by get_frame and get_earth_ellipsoid, so importing the model neither
+starts the virtual machine nor loads EOP data. "inertial" is EME2000 and
+"earth_fixed" is ITRF (IERS 2010). "cirf" and "tirf" are the intermediate
+frames of the IERS 2010 chain: the inertial to Earth fixed rotation is split
+into a slow part from inertial to CIRF (frame bias, precession and nutation),
+the Earth rotation angle about the CIRF pole, and a slow part from TIRF to
+ITRF (polar motion).
+"""
+_frames = {}
+_earth_ellipsoid = None
+
+"""
+Frames get_positions can express trajectories in, with the internal frame
+used for each. EME2000 needs no rotation, GCRF only differs from it by the
+constant frame bias, which is computed once and broadcast over every grid,
+ITRF uses rotation_stack, and the precession/nutation frames (MOD, TOD, TEME)
+are built like it according to the frame mode, their whole rotation being
+interpolated linearly between nodes in "components" mode
+"""
+OUTPUT_FRAMES = {"EME2000": "inertial", "GCRF": "gcrf", "MOD": "mod",
+                 "TOD": "tod", "TEME": "teme", "ITRF": "earth_fixed"}
+CONSTANT_FRAMES = ("gcrf",)
+
+_constant_rotations = {}
+
+"""
+ecef_to_lla uses the same WGS84 parameters as the Earth ellipsoid. The geodetic
+latitude is refined until it changes by less than GEODETIC_TOLERANCE (radian,
+1e-14 is well below a micrometre on the surface)
+"""
+GEODETIC_TOLERANCE = 1e-14
+GEODETIC_MAX_ITER = 10
+
+"""
+Ways of building the rotation stack of a time grid. In "components" mode
+Orekit is only queried every FRAME_NODE_STEP seconds; between nodes the slow
+rotations are interpolated linearly and the Earth rotation angle, which is
+linear in UT1, is interpolated on its unwrapped value. In "slerp" mode the
+full Orekit transform is computed every FRAME_SLERP_STEP seconds and the
+rotations are slerped in between. "exact" queries Orekit at every sample.
+
+Interpolated stacks are compared against exact transforms at
+FRAME_CHECK_SAMPLES random samples (drawn with FRAME_CHECK_SEED, so that the
+same grid always gets the same nodes), and the node spacing is halved until the
+angular error is within FRAME_CHECK_TOLERANCE (radian, 1e-10 is about 0.7 mm
+at low Earth orbit distances). Rotation rate stacks are built the same way,
+interpolated linearly in both modes and checked on their relative error
+"""
+FRAME_MODES = ("components", "slerp", "exact")
+FRAME_NODE_STEP = 3600.0        # s
+FRAME_SLERP_STEP = 600.0        # s
+FRAME_CHECK_SAMPLES = 4
+FRAME_CHECK_SEED = 0
+FRAME_CHECK_TOLERANCE = 1e-10   # radian
+
+_frame_settings = {"mode": "components",
+                   "node_step": None,
+                   "check_samples": FRAME_CHECK_SAMPLES,
+                   "tolerance": FRAME_CHECK_TOLERANCE}
+
+"""
+Generation of the frame settings, bumped by set_frame_mode. Products built from
+rotation stacks (the Earth-fixed products of every satellite and fleet) record
+the generation they were built with and are recomputed once it changes
+"""
+_frame_generation = 0
+
+"""
+The rotation at a given date is the same for every satellite, so rotation
+stacks are kept in a module level cache shared by all satellites, keyed by
+epoch and time grid and holding at most TRANSFORM_CACHE_MAX_BYTES (least
+recently used stacks are evicted first). The cache is cleared whenever the set
+of data files loaded by Orekit (EOP, leap seconds, ...) or their modification
+times change
+"""
+TRANSFORM_CACHE_MAX_BYTES = 64 * 2**20
+
+_transform_cache = OrderedDict()
+_transform_signature = None
+_transform_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0,
+                    "disk_hits": 0}
+
+"""
+Optional on-disk cache shared between processes, enabled by set_disk_cache.
+Stacks are stored as .npy files named after a hash of the product, epoch,
+time grid, frame mode and the contents of the data actually registered with
+Orekit (the data pack when one is used, otherwise the EOP files in EOP_DIR),
+and are loaded back as read-only memory maps without copying
+"""
+EOP_DIR = (Path(__file__).resolve().parents[2] / "data" / "orekit-data-master"
+           / "orekit-data-master" / "Earth-Orientation-Parameters")
+
+_disk_cache_dir = None
+_data_digest_memo = None
+
+def get_frame(name):
+    """
+    Retrieve a frame of reference, building it on first use
+
+    Parameters
+    ----------
+    name : str
+        "inertial", "earth_fixed", "cirf", "tirf", "gcrf", "mod", "tod" or
+        "teme"
+
+    Returns
+    -------
+    frame : Frame
+        Orekit frame
+    """
+    if name not in _frames:
+        ensure_vm()
+        from org.orekit.frames import FramesFactory
+        from org.orekit.utils import IERSConventions
+
+        builders = {"inertial": FramesFactory.getEME2000,
+                    "earth_fixed": lambda: FramesFactory.getITRF(IERSConventions.IERS_2010, True),
+                    "cirf": lambda: FramesFactory.getCIRF(IERSConventions.IERS_2010, True),
+                    "tirf": lambda: FramesFactory.getTIRF(IERSConventions.IERS_2010, True),
+                    "gcrf": FramesFactory.getGCRF,
+                    "mod": lambda: FramesFactory.getMOD(IERSConventions.IERS_2010),
+                    "tod": lambda: FramesFactory.getTOD(IERSConventions.IERS_2010, True),
+                    "teme": FramesFactory.getTEME}
+        if name not in builders:
+            raise ValueError(f"Unknown frame: {name}")
+        _frames[name] = builders[name]()
+    return _frames[name]
+
+def get_earth_ellipsoid():
+    """
+    Retrieve the WGS84 model of the Earth, building it on first use
+
+    Returns
+    -------
+    earth_ellipsoid : OneAxisEllipsoid
+        Ellipsoid attached to the Earth fixed frame
+    """
+    global _earth_ellipsoid
+    if _earth_ellipsoid is None:
+        from org.orekit.bodies import OneAxisEllipsoid
+        _earth_ellipsoid = OneAxisEllipsoid(WGS84_EARTH_EQUATORIAL_RADIUS,
+                                            WGS84_EARTH_FLATTENING,
+                                            get_frame("earth_fixed"))
+    return _earth_ellipsoid
+
+def _matrix(source, target, date):
+    """
+    Rotation matrix from one frame to another at a given date
+
+    Parameters
+    ----------
+    source : Frame
+        Frame the vectors are expressed in
+    target : Frame
+        Frame the vectors are transformed to
+    date : AbsoluteDate
+        Date of the transform
+
+    Returns
+    -------
+    matrix : array
+        Matrix M such that x_target = M @ x_source, shape (3, 3)
+    """
+    return np.array(source.getTransformTo(target, date).getRotation().getMatrix())
+
+def _node_rotations(epoch, nodes):
+    """
+    Query Orekit for the components of the inertial to Earth fixed rotation
+    at a set of nodes
+
+    Parameters
+    ----------
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    nodes : np.array
+        Array of node timesteps (s)
+
+    Returns
+    -------
+    precession : array
+        Inertial to CIRF matrices, shape (K, 3, 3)
+    era : np.array
+        Unwrapped Earth rotation angles (radian)
+    polar : array
+        TIRF to ITRF matrices, shape (K, 3, 3)
+    """
+    precession = np.zeros((len(nodes), 3, 3))
+    polar = np.zeros((len(nodes), 3, 3))
+    era = np.zeros(len(nodes))
+
+    inertial, cirf = get_frame("inertial"), get_frame("cirf")
+    tirf, earth_fixed = get_frame("tirf"), get_frame("earth_fixed")
+    for idx, time_offset in enumerate(nodes):
+        date = epoch.shiftedBy(float(time_offset))
+        precession[idx] = _matrix(inertial, cirf, date)
+        spin = _matrix(cirf, tirf, date)
+        era[idx] = np.arctan2(spin[0, 1], spin[0, 0])
+        polar[idx] = _matrix(tirf, earth_fixed, date)
+
+    return precession, np.unwrap(era), polar
+
+def _spin_matrices(era):
+    """
+    Rotation matrices about the pole by the Earth rotation angle
+
+    Parameters
+    ----------
+    era : np.array
+        Earth rotation angles (radian)
+
+    Returns
+    -------
+    spin : array
+        CIRF to TIRF matrices, shape (T, 3, 3)
+    """
+    cos_a, sin_a = np.cos(era), np.sin(era)
+    spin = np.zeros((len(era), 3, 3))
+    spin[:, 0, 0] = cos_a
+    spin[:, 0, 1] = sin_a
+    spin[:, 1, 0] = -sin_a
+    spin[:, 1, 1] = cos_a
+    spin[:, 2, 2] = 1
+    return spin
+
+def _interp_matrices(times, nodes, matrices):
+    """
+    Linearly interpolate every element of a stack of matrices
+
+    Parameters
+    ----------
+    times : np.array
+        Array of timesteps to interpolate at (s)
+    nodes : np.array
+        Increasing array of node timesteps (s)
+    matrices : array
+        Matrices at the nodes, shape (K, 3, 3)
+
+    Returns
+    -------
+    interpolated : array
+        Matrices at the timesteps, shape (T, 3, 3)
+    """
+    flat = matrices.reshape(len(nodes), 9)
+    columns = [np.interp(times, nodes, flat[:, k]) for k in range(9)]
+    return np.stack(columns, axis = -1).reshape(len(times), 3, 3)
+
+def _data_signature():
+    """
+    Describe the data files loaded by Orekit, so that cached transforms can
+    be invalidated when they change
+
+    Returns
+    -------
+    signature : tuple
+        ((name, modification time), ...) for each loaded data file, the
+        time being None for entries that are not plain files
+    """
+    ensure_vm()
+    from org.orekit.data import DataContext
+
+    manager = DataContext.getDefault().getDataProvidersManager()
+    signature = []
+    for name in sorted(str(name) for name in manager.getLoadedDataNames()):
+        mtime = os.path.getmtime(name) if os.path.isfile(name) else None
+        signature.append((name, mtime))
+    
+    # Entries of a data pack have no modification time of their own, the
+    # pack itself stands for them
+    source = data_source()
+    if source is not None and source.is_file():
+        signature.append((str(source), source.stat().st_size, 
+                          source.stat().st_mtime_ns))
+    return tuple(signature)
+
+def set_disk_cache(directory):
+    """
+    Enable or disable the on-disk cache of rotation stacks
+
+    Parameters
+    ----------
+    directory : str or Path or None
+        Directory holding the cached stacks, created if needed. None
+        disables the on-disk cache
+
+    Returns
+    -------
+    """
+    global _disk_cache_dir
+    if directory is None:
+        _disk_cache_dir = None
+    else:
+        _disk_cache_dir = Path(directory)
+        _disk_cache_dir.mkdir(parents = True, exist_ok = True)
+
+def _data_digest():
+    """
+    Hash of the Earth orientation data registered with Orekit: the whole
+    data pack when one is used, otherwise the EOP files of the raw tree.
+    Recomputed only when their sizes or modification times change
+
+    Returns
+    -------
+    digest : str
+        Hexadecimal SHA-1 digest
+    """
+    global _data_digest_memo
+    ensure_vm()
+    source = data_source()
+    if source is not None and source.is_file():
+        root, files = source.parent, [source]
+    else:
+        root, files = EOP_DIR, sorted(path for path in EOP_DIR.rglob("*") 
+                                      if path.is_file())
+    stamp = tuple((str(path), path.stat().st_size, path.stat().st_mtime_ns)
+                  for path in files)
+    if _data_digest_memo is None or _data_digest_memo[0] != stamp:
+        sha = hashlib.sha1()
+        for path in files:
+            sha.update(str(path.relative_to(root)).encode())
+            sha.update(path.read_bytes())
+        _data_digest_memo = (stamp, sha.hexdigest())
+    return _data_digest_memo[1]
+
+def _disk_path(key):
+    """
+    File of the on-disk cache holding a product
+
+    Parameters
+    ----------
+    key : tuple
+        Key of the product in the transform cache
+
+    Returns
+    -------
+    path : Path
+        Path of the .npy file
+    """
+    # Every setting which changes how a stack is built or checked is part of
+    # the name, so unchecked stacks are never served as checked ones
+    description = repr((key, _frame_settings["mode"], _frame_settings["node_step"],
+                        _frame_settings["check_samples"], _frame_settings["tolerance"],
+                        _data_digest()))
+    return _disk_cache_dir / (hashlib.sha1(description.encode()).hexdigest() + ".npy")
+
+def _load_or_compute(key, epoch, times, compute):
+    """
+    Read a product from the on-disk cache, or compute it and store it there
+
+    Parameters
+    ----------
+    key : tuple
+        Key of the product in the transform cache
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    times : np.array
+        Array of timesteps (s)
+    compute : callable
+        Function of (epoch, times) computing the product
+
+    Returns
+    -------
+    product : array
+        Read-only product, memory mapped when it comes from disk
+    """
+    if _disk_cache_dir is None:
+        product = compute(epoch, times)
+        product.setflags(write = False)
+        return product
+
+    path = _disk_path(key)
+    if path.is_file():
+        try:
+            product = np.load(path, mmap_mode = "r")
+            if len(product) == len(times):
+                _transform_stats["disk_hits"] += 1
+                return product
+        except (OSError, ValueError):
+            # Unreadable file, e.g. from an interrupted write elsewhere
+            pass
+
+    product = compute(epoch, times)
+    product.setflags(write = False)
+
+    # Write to a temporary file first so that readers never see partial data
+    temp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+    with open(temp_path, "wb") as file:
+        np.save(file, product)
+    os.replace(temp_path, path)
+    return product
+
+def _check_signature():
+    """
+    Clear the transform cache if the loaded data files changed
+
+    Returns
+    -------
+    """
+    global _transform_signature
+    signature = _data_signature()
+    if signature != _transform_signature:
+        if _transform_cache:
+            _transform_stats["invalidations"] += 1
+        _transform_cache.clear()
+        _transform_signature = signature
+
+def _cached(kind, epoch, times, compute):
+    """
+    Look up a per-grid transform product in the shared cache, computing and
+    storing it on a miss
+
+    Parameters
+    ----------
+    kind : str
+        Name of the product ("rotations" or "rates")
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    times : np.array
+        Array of timesteps (s)
+    compute : callable
+        Function of (epoch, times) computing the product
+
+    Returns
+    -------
+    product : array
+        Read-only product
+    """
+    from org.orekit.time import AbsoluteDate
+    _check_signature()
+
+    key = (kind, epoch.durationFrom(AbsoluteDate.J2000_EPOCH), grid_key(times))
+    cached = _transform_cache.get(key)
+    if cached is not None and np.array_equal(cached[0], times):
+        _transform_cache.move_to_end(key)
+        _transform_stats["hits"] += 1
+        return cached[1]
+
+    _transform_stats["misses"] += 1
+    check_eop_coverage(epoch, times)
+    product = _load_or_compute(key, epoch, times, compute)
+
+    # Computing the product may have loaded further data files
+    _check_signature()
+    _transform_cache[key] = (np.array(times, dtype = float), product)
+    while len(_transform_cache) > 1 and _cache_nbytes() > TRANSFORM_CACHE_MAX_BYTES:
+        _transform_cache.popitem(last = False)
+        _transform_stats["evictions"] += 1
+
+    return product
+
+def rotation_stack(epoch, times):
+    """
+    Inertial (EME2000) to Earth fixed (ITRF) rotation matrices over a whole
+    time grid, shared by every satellite through the transform cache
+
+    Parameters
+    ----------
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    times : np.array
+        Array of timesteps (s)
+
+    Returns
+    -------
+    rotations : array
+        Read-only matrices M such that x_ecef = M @ x_eci, shape (T, 3, 3)
+    """
+    return _cached("rotations", epoch, times, _compute_rotation_stack)
+
+def rotation_rate_stack(epoch, times):
+    """
+    Rotation rate of the Earth fixed frame with respect to the inertial frame
+    over a whole time grid, shared through the transform cache
+
+    Parameters
+    ----------
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    times : np.array
+        Array of timesteps (s)
+
+    Returns
+    -------
+    rates : array
+        Read-only rotation rates expressed in the Earth fixed frame, shape
+        (T, 3) (radian s^-1)
+    """
+    return _cached("rates", epoch, times, _compute_rate_stack)
+
+def frame_rotation_stack(epoch, times, frame):
+    """
+    Rotation matrices from the inertial frame (EME2000) to one of the
+    OUTPUT_FRAMES over a whole time grid
+
+    Parameters
+    ----------
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    times : np.array
+        Array of timesteps (s)
+    frame : str
+        Name of the target frame, a key of OUTPUT_FRAMES
+
+    Returns
+    -------
+    rotations : array
+        Read-only matrices M such that x_frame = M @ x_eci, shape (T, 3, 3)
+    """
+    if frame not in OUTPUT_FRAMES:
+        raise ValueError(f"Unknown output frame: {frame}")
+    target = OUTPUT_FRAMES[frame]
+
+    if target == "earth_fixed":
+        return rotation_stack(epoch, times)
+
+    if target == "inertial" or target in CONSTANT_FRAMES:
+        # Time independent rotations are computed once and broadcast
+        if target not in _constant_rotations:
+            if target == "inertial":
+                matrix = np.eye(3)
+            else:
+                matrix = _matrix(get_frame("inertial"), get_frame(target), epoch)
+            matrix.setflags(write = False)
+            _constant_rotations[target] = matrix
+        return np.broadcast_to(_constant_rotations[target], (len(times), 3, 3))
+
+    return _cached(f"rotations_{target}", epoch, times,
+                   lambda epoch, times: _compute_rotation_stack(epoch, times, target))
+
+def _cache_nbytes():
+    return sum(times.nbytes + rotations.nbytes
+               for times, rotations in _transform_cache.values())
+
+def clear_transform_cache():
+    """
+    Drop every cached rotation stack
+
+    Returns
+    -------
+    """
+    _transform_cache.clear()
+    _constant_rotations.clear()
+
+def transform_cache_stats():
+    """
+    Report the state of the shared transform cache
+
+    Returns
+    -------
+    stats : dict
+        Number of grids, bytes held, byte budget, hits, misses, evicted
+        grids, invalidations caused by data file changes and stacks read
+        from the on-disk cache
+    """
+    return {"grids": len(_transform_cache),
+            "nbytes": _cache_nbytes(),
+            "max_bytes": TRANSFORM_CACHE_MAX_BYTES,
+            **_transform_stats}
+
+def set_frame_mode(mode, node_step = None, check_samples = FRAME_CHECK_SAMPLES,
+                   tolerance = FRAME_CHECK_TOLERANCE):
+    """
+    Select how rotation stacks are built, for every satellite. Cached stacks
+    are dropped, and so are the products of every satellite built from them
+    on their next use
+
+    Parameters
+    ----------
+    mode : str
+        One of FRAME_MODES
+    node_step = None : float
+        Spacing between exact transforms (s), FRAME_NODE_STEP or
+        FRAME_SLERP_STEP if not given
+    check_samples = FRAME_CHECK_SAMPLES : int
+        Number of random samples checked against exact transforms, 0
+        disables the check
+    tolerance = FRAME_CHECK_TOLERANCE : float
+        Maximum angular error of the interpolated rotations (radian)
+
+    Returns
+    -------
+    """
+    if mode not in FRAME_MODES:
+        raise ValueError(f"Unknown frame mode: {mode}")
+
+    global _frame_generation
+    _frame_settings.update(mode = mode, node_step = node_step,
+                           check_samples = check_samples, tolerance = tolerance)
+    _frame_generation += 1
+    clear_transform_cache()
+
+def frame_generation():
+    """
+    Identify the current frame settings
+
+    Returns
+    -------
+    generation : int
+        Number of calls to set_frame_mode so far
+    """
+    return _frame_generation
+
+def _exact_stack(epoch, times, target = "earth_fixed"):
+    """
+    Query Orekit for the rotation from the inertial frame at every sample
+
+    Parameters
+    ----------
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    times : np.array
+        Array of timesteps (s)
+    target = "earth_fixed" : str
+        Name of the target frame, see get_frame
+
+    Returns
+    -------
+    rotations : array
+        Rotation matrices, shape (T, 3, 3)
+    """
+    inertial, target_frame = get_frame("inertial"), get_frame(target)
+    rotations = np.zeros((len(times), 3, 3))
+    for idx, time_offset in enumerate(times):
+        rotations[idx] = _matrix(inertial, target_frame,
+                                 epoch.shiftedBy(float(time_offset)))
+    return rotations
+
+def _components_stack(epoch, nodes, times, target = "earth_fixed"):
+    """
+    Interpolate the components of the rotation between nodes. Rotations to
+    the slowly rotating frames have a single component, interpolated as a
+    whole
+
+    Parameters
+    ----------
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    nodes : np.array
+        Increasing array of node timesteps (s)
+    times : np.array
+        Array of timesteps within the nodes (s)
+    target = "earth_fixed" : str
+        Name of the target frame, see get_frame
+
+    Returns
+    -------
+    rotations : array
+        Rotation matrices, shape (T, 3, 3)
+    """
+    if target != "earth_fixed":
+        return _interp_matrices(times, nodes, _exact_stack(epoch, nodes, target))
+
+    precession, era, polar = _node_rotations(epoch, nodes)
+    precession = _interp_matrices(times, nodes, precession)
+    era = np.interp(times, nodes, era)
+    polar = _interp_matrices(times, nodes, polar)
+
+    return polar @ _spin_matrices(era) @ precession
+
+def _slerp_stack(epoch, nodes, times, target = "earth_fixed"):
+    """
+    Slerp the full rotation between nodes
+
+    Parameters
+    ----------
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    nodes : np.array
+        Increasing array of node timesteps (s)
+    times : np.array
+        Array of timesteps within the nodes (s)
+    target = "earth_fixed" : str
+        Name of the target frame, see get_frame
+
+    Returns
+    -------
+    rotations : array
+        Rotation matrices, shape (T, 3, 3)
+    """
+    slerp = Slerp(nodes, R.from_matrix(_exact_stack(epoch, nodes, target)))
+    return slerp(times).as_matrix()
+
+def _exact_rates(epoch, times):
+    """
+    Query Orekit for the rotation rate of the Earth fixed frame at every
+    sample
+
+    Parameters
+    ----------
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    times : np.array
+        Array of timesteps (s)
+
+    Returns
+    -------
+    rates : array
+        Rotation rates expressed in the Earth fixed frame, shape (T, 3)
+        (radian s^-1)
+    """
+    inertial, earth_fixed = get_frame("inertial"), get_frame("earth_fixed")
+    rates = np.zeros((len(times), 3))
+    for idx, time_offset in enumerate(times):
+        date = epoch.shiftedBy(float(time_offset))
+        rate = inertial.getTransformTo(earth_fixed, date).getRotationRate()
+        rates[idx] = rate.getX(), rate.getY(), rate.getZ()
+    return rates
+
+def _interp_rates(epoch, nodes, times):
+    """
+    Interpolate the rotation rate linearly between nodes, the rate varying
+    far more slowly than the rotation itself
+
+    Parameters
+    ----------
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    nodes : np.array
+        Increasing array of node timesteps (s)
+    times : np.array
+        Array of timesteps within the nodes (s)
+
+    Returns
+    -------
+    rates : array
+        Rotation rates expressed in the Earth fixed frame, shape (T, 3)
+        (radian s^-1)
+    """
+    rates = _exact_rates(epoch, nodes)
+    return np.column_stack([np.interp(times, nodes, rates[:, k]) for k in range(3)])
+
+def _mode_stack(epoch, times, exact, components, slerp, error):
+    """
+    Build a per-sample transform product over a whole time grid according to
+    the frame mode, checking interpolated products against exact ones
+
+    Parameters
+    ----------
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    times : np.array
+        Array of timesteps (s)
+    exact : callable
+        Function of (epoch, times) querying Orekit at every sample
+    components : callable
+        Function of (epoch, nodes, times) interpolating between nodes in
+        "components" mode
+    slerp : callable
+        Function of (epoch, nodes, times) interpolating between nodes in
+        "slerp" mode
+    error : callable
+        Function of (exact, interpolated) products returning the error
+        compared with the tolerance
+
+    Returns
+    -------
+    product : array
+        Product on the timesteps
+    """
+    times = np.asarray(times, dtype = float)
+    mode = _frame_settings["mode"]
+
+    # Unsorted grids are evaluated directly at every sample
+    if mode == "exact" or len(times) < 2 or np.any(np.diff(times) <= 0):
+        return exact(epoch, times)
+
+    if mode == "slerp":
+        interpolate, default_step = slerp, FRAME_SLERP_STEP
+    else:
+        interpolate, default_step = components, FRAME_NODE_STEP
+    step = _frame_settings["node_step"] or default_step
+    check_samples = _frame_settings["check_samples"]
+    rng = np.random.default_rng(FRAME_CHECK_SEED)
+
+    while True:
+        count = int(np.ceil((times[-1] - times[0]) / step)) + 1
+
+        # Nodes as dense as the grid itself bring no benefit
+        if len(times) <= count:
+            return exact(epoch, times)
+
+        nodes = np.linspace(times[0], times[-1], count)
+        product = interpolate(epoch, nodes, times)
+        if check_samples == 0:
+            return product
+
+        # Compare against exact values at random samples
+        check = rng.choice(len(times), min(check_samples, len(times)),
+                           replace = False)
+        if error(exact(epoch, times[check]), product[check]) <= _frame_settings["tolerance"]:
+            return product
+        step /= 2
+
+def _compute_rate_stack(epoch, times):
+    """
+    Rotation rate of the Earth fixed frame with respect to the inertial frame
+    over a whole time grid, built according to the frame mode. The rate is
+    interpolated linearly in both interpolated modes, and checked on its
+    relative error
+
+    Parameters
+    ----------
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    times : np.array
+        Array of timesteps (s)
+
+    Returns
+    -------
+    rates : array
+        Rotation rates expressed in the Earth fixed frame, shape (T, 3)
+        (radian s^-1)
+    """
+    def error(exact, rates):
+        return np.max(np.linalg.norm(exact - rates, axis = 1)
+                      / np.linalg.norm(exact, axis = 1))
+
+    return _mode_stack(epoch, times, _exact_rates, _interp_rates, _interp_rates,
+                       error)
+
+def _compute_rotation_stack(epoch, times, target = "earth_fixed"):
+    """
+    Rotation matrices from the inertial frame (EME2000) to another frame,
+    Earth fixed (ITRF) by default, over a whole time grid, built according
+    to the frame mode
+
+    Parameters
+    ----------
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    times : np.array
+        Array of timesteps (s)
+    target = "earth_fixed" : str
+        Name of the target frame, see get_frame
+
+    Returns
+    -------
+    rotations : array
+        Matrices M such that x_target = M @ x_eci, shape (T, 3, 3)
+    """
+    def error(exact, rotations):
+        # Angle of the residual rotation, for small angles
+        return np.max(np.linalg.norm(exact - rotations, axis = (1, 2))) / np.sqrt(2)
+
+    return _mode_stack(epoch, times,
+                       lambda epoch, times: _exact_stack(epoch, times, target),
+                       lambda epoch, nodes, times: _components_stack(epoch, nodes,
+                                                                     times, target),
+                       lambda epoch, nodes, times: _slerp_stack(epoch, nodes,
+                                                                times, target),
+                       error)
+
+def rotate(rotations, vectors):
+    """
+    Apply a stack of rotation matrices to an array of vectors in one batch
+
+    Parameters
+    ----------
+    rotations : array
+        Rotation matrices, shape (T, 3, 3)
+    vectors : array
+        Vectors, shape (T, 3)
+
+    Returns
+    -------
+    rotated : array
+        Rotated vectors, shape (T, 3)
+    """
+    return np.einsum("tij,tj->ti", rotations, vectors)
+
+def ecef_to_lla(ecef):
+    """
+    Convert ECEF positions into geodetic coordinates on the WGS84 ellipsoid
+    for a whole array at once, using Bowring's iteration on the parametric
+    latitude
+
+    Parameters
+    ----------
+    ecef : array
+        Array of ECEF positions, shape (T, 3) (m, m, m)
+
+    Returns
+    -------
+    lla : array
+        Array of latitude, longitude, altitude, shape (T, 3) (deg, deg, m)
+    """
+    a = WGS84_EARTH_EQUATORIAL_RADIUS
+    f = WGS84_EARTH_FLATTENING
+    b = a * (1 - f)
+    e2 = f * (2 - f)
+    ep2 = e2 / (1 - e2)
+
+    x, y, z = ecef[:, 0], ecef[:, 1], ecef[:, 2]
+    p = np.hypot(x, y)
+
+    beta = np.arctan2(z, (1 - f) * p)
+    lat = np.arctan2(z, (1 - e2) * p)
+    for _ in range(GEODETIC_MAX_ITER):
+        lat_new = np.arctan2(z + ep2 * b * np.sin(beta)**3,
+                             p - e2 * a * np.cos(beta)**3)
+        beta = np.arctan2((1 - f) * np.sin(lat_new), np.cos(lat_new))
+        converged = np.all(np.abs(lat_new - lat) < GEODETIC_TOLERANCE)
+        lat = lat_new
+        if converged:
+            break
+
+    # Altitude form which stays well conditioned at the poles
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    alt = p * cos_lat + z * sin_lat - a * np.sqrt(1 - e2 * sin_lat**2)
+
+    return np.column_stack([np.rad2deg(lat), np.rad2deg(np.arctan2(y, x)), alt])
+
+def ground_track(lla, central_meridian = 0.0):
+    """
+    Build a plottable ground track from geodetic coordinates. Longitudes are
+    wrapped into [central_meridian - 180, central_meridian + 180) and, at
+    every crossing of the map edge, the track is closed on the edge it
+    leaves, broken by a NaN separator and reopened on the opposite edge, at
+    the latitude interpolated at the crossing. All breaks are inserted in a
+    single pass
+
+    Parameters
+    ----------
+    lla : array
+        Array of latitude, longitude, altitude, shape (T, 3) (deg, deg, m)
+    central_meridian = 0.0 : float
+        Longitude at the centre of the map (deg)
+
+    Returns
+    -------
+    gtc : array
+        Array of ground track positions (deg, deg), shape (T + 3 B, 2) for B
+        edge crossings
+    """
+    lat = lla[:, 0]
+    lon = np.mod(lla[:, 1] - central_meridian + 180, 360) - 180
+
+    # Samples after which the track leaves the map, and the signed step in
+    # longitude across the edge
+    breaks = np.where(np.abs(np.diff(lon)) > 180)[0]
+    step = np.mod(lon[breaks + 1] - lon[breaks] + 180, 360) - 180
+    edge = np.where(step > 0, 180.0, -180.0)
+    fraction = (edge - lon[breaks]) / step
+    lat_edge = lat[breaks] + fraction * (lat[breaks + 1] - lat[breaks])
+
+    # Each break adds three rows: the closing edge point, the separator and
+    # the opening edge point
+    shift = 3 * np.searchsorted(breaks, np.arange(len(lon)), side = "left")
+    at_break = breaks + shift[breaks]
+
+    gtc = np.full((len(lon) + 3 * len(breaks), 2), np.nan)
+    gtc[np.arange(len(lon)) + shift] = np.column_stack([lon, lat])
+    gtc[at_break + 1] = np.column_stack([edge, lat_edge])
+    gtc[at_break + 3] = np.column_stack([-edge, lat_edge])
+    gtc[:, 0] += central_meridian
+    return gtc
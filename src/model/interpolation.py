@@ -0,0 +1,41 @@
+import numpy as np
+
+def hermite(t_nodes, poses, vels, t_query):
+    """
+    Cubic Hermite interpolation of positions and velocities
+
+    Parameters
+    ----------
+    t_nodes : np.array
+        Increasing array of node timesteps (s)
+    poses : array
+        Array of positions at the nodes (m, m, m)
+    vels : array
+        Array of velocities at the nodes (m s^-1, m s^-1, m s^-1)
+    t_query : np.array
+        Array of timesteps to interpolate at, within the node range (s)
+
+    Returns
+    -------
+    poses_q : array
+        Array of interpolated positions (m, m, m)
+    vels_q : array
+        Array of interpolated velocities (m s^-1, m s^-1, m s^-1)
+    """
+    idx = np.searchsorted(t_nodes, t_query, side = "right") - 1
+    idx = np.clip(idx, 0, len(t_nodes) - 2)
+
+    h = (t_nodes[idx + 1] - t_nodes[idx])[:, None]
+    s = ((t_query - t_nodes[idx]))[:, None] / h
+    s2, s3 = s**2, s**3
+
+    p0, p1 = poses[idx], poses[idx + 1]
+    v0, v1 = vels[idx], vels[idx + 1]
+
+    # Hermite basis functions and their time derivatives
+    poses_q = ((2*s3 - 3*s2 + 1) * p0 + (s3 - 2*s2 + s) * h * v0
+               + (-2*s3 + 3*s2) * p1 + (s3 - s2) * h * v1)
+    vels_q = ((6*s2 - 6*s) / h * p0 + (3*s2 - 4*s + 1) * v0
+              + (-6*s2 + 6*s) / h * p1 + (3*s2 - 2*s) * v1)
+
+    return poses_q, vels_q
@@ -0,0 +1,144 @@
+import json
+import warnings
+import zipfile
+from pathlib import Path
+
+"""
+The Orekit virtual machine and data are only set up on first use (the first
+Satellite or frame conversion), so importing the model or the GUI does not pay
+for them. The compact data pack written by build_data_pack.py is preferred
+when it exists, otherwise the raw orekit-data-master tree is used. A pack only
+holds the EOP of a range of dates (recorded in its zip comment), and
+check_eop_coverage warns when a computation needs dates outside it
+"""
+project_root = Path(__file__).resolve().parents[2]
+RAW_DATA_DIR = project_root / "data" / "orekit-data-master"
+DATA_PACK = project_root / "data" / "orekit-data-pack.zip"
+
+_vm = None
+_data_source = None
+_pack_coverage = {}
+
+def _start_vm():
+    """
+    Start the virtual machine, or attach to the one already running
+
+    Returns
+    -------
+    vm : JCCEnv
+        Orekit virtual machine
+    """
+    global _vm
+    if _vm is None:
+        import orekit
+        _vm = orekit.getVMEnv() or orekit.initVM()
+    return _vm
+
+def setup_orekit_data(pack = DATA_PACK, raw_dir = RAW_DATA_DIR):
+    """
+    Register the Orekit data with the default data context, starting the
+    virtual machine if needed
+
+    Parameters
+    ----------
+    pack = DATA_PACK : Path
+        Data pack built by build_data_pack.py
+    raw_dir = RAW_DATA_DIR : Path
+        Raw data tree used when the pack does not exist
+
+    Returns
+    -------
+    source : Path
+        Data pack or directory that was registered
+    """
+    global _data_source
+    _start_vm()
+    from orekit.pyhelpers import setup_orekit_curdir
+
+    source = Path(pack) if pack is not None and Path(pack).is_file() else Path(raw_dir)
+    setup_orekit_curdir(str(source))
+    _data_source = source
+    return source
+
+def ensure_vm():
+    """
+    Make sure the virtual machine is running and the default data is
+    registered. Cheap to call once both are set up
+
+    Returns
+    -------
+    vm : JCCEnv
+        Orekit virtual machine
+    """
+    vm = _start_vm()
+    if _data_source is None:
+        setup_orekit_data()
+    return vm
+
+def data_source():
+    """
+    Data registered with Orekit
+
+    Returns
+    -------
+    source : Path or None
+        Data pack or directory registered, None before setup_orekit_data
+    """
+    return _data_source
+
+def pack_eop_range(pack):
+    """
+    Range of dates covered by the EOP tables of a data pack
+
+    Parameters
+    ----------
+    pack : Path
+        Data pack built by build_data_pack.py
+
+    Returns
+    -------
+    coverage : tuple or None
+        (first MJD, last MJD), None if the pack does not record it
+    """
+    pack = Path(pack)
+    stamp = (pack.stat().st_size, pack.stat().st_mtime_ns)
+    if _pack_coverage.get(pack, (None,))[0] != stamp:
+        coverage = None
+        try:
+            with zipfile.ZipFile(pack) as archive:
+                coverage = tuple(json.loads(archive.comment.decode())["eop_mjd"])
+        except (ValueError, KeyError, zipfile.BadZipFile):
+            pass
+        _pack_coverage[pack] = (stamp, coverage)
+    return _pack_coverage[pack][1]
+
+def check_eop_coverage(epoch, times):
+    """
+    Warn when a time grid falls outside the EOP range of the registered data
+    pack. Orekit would then extrapolate the Earth orientation silently
+
+    Parameters
+    ----------
+    epoch : AbsoluteDate
+        Reference date of the timesteps
+    times : np.array
+        Array of timesteps (s)
+
+    Returns
+    -------
+    """
+    if _data_source is None or not _data_source.is_file() or len(times) == 0:
+        return
+    coverage = pack_eop_range(_data_source)
+    if coverage is None:
+        return
+
+    from org.orekit.time import AbsoluteDate
+    # J2000_EPOCH is MJD 51544.5
+    start = 51544.5 + (epoch.durationFrom(AbsoluteDate.J2000_EPOCH) + min(times)) / 86400
+    end = 51544.5 + (epoch.durationFrom(AbsoluteDate.J2000_EPOCH) + max(times)) / 86400
+    if start < coverage[0] or end > coverage[1]:
+        warnings.warn(f"Dates MJD {start:.1f}-{end:.1f} are outside the EOP range "
+                      f"MJD {coverage[0]:.0f}-{coverage[1]:.0f} of {_data_source}; "
+                      "rebuild it with build_data_pack.py --start-year/--end-year "
+                      "or remove it to use the raw data tree", stacklevel = 3)
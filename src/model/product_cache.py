@@ -0,0 +1,582 @@
+import hashlib
+import itertools
+import weakref
+from collections import OrderedDict
+import numpy as np
+
+"""
+Default memory budget for the products of a single satellite (bytes)
+"""
+DEFAULT_MAX_BYTES = 128 * 2**20
+
+"""
+Storage policies for cached products. "float64" keeps the computed arrays,
+"float32" halves their size, "relative" stores position-like (T, 3) arrays
+(RELATIVE_PRODUCTS, and the products named with one of RELATIVE_PREFIXES, i.e.
+the positions in other output frames) as float32 offsets from a sparse float64
+reference. Offsets are kept below RELATIVE_MAX_OFFSET (m, or m s^-1 for
+"ecef_vels"), where float32 still resolves about a millimetre, so
+fine grids shrink to roughly half their size at no practical loss. The time
+grid itself is always kept in float64, and getters always return float64.
+"""
+STORAGE_POLICIES = ("float64", "float32", "relative")
+RELATIVE_MAX_OFFSET = 16e3
+RELATIVE_MAX_BLOCK = 256
+RELATIVE_PRODUCTS = ("poses", "ecef", "ecef_vels")
+RELATIVE_PREFIXES = ("poses_",)
+
+"""
+Optional budget (bytes) shared by the caches of every satellite. When it is
+exceeded, the least recently used products across all caches are dropped and
+recomputed on their next use. None means no global budget
+"""
+_global_max_bytes = None
+_caches = weakref.WeakSet()
+_clock = itertools.count()
+
+# Running total of the bytes held by every cache, kept up to date as products
+# are stored and dropped so that checking the budget costs nothing
+_global_nbytes = 0
+
+def _count_bytes(delta, counter = None):
+    """
+    Add to the running byte totals
+
+    Parameters
+    ----------
+    delta : int
+        Change in bytes held
+    counter = None : list
+        One element byte counter of the cache holding the bytes
+
+    Returns
+    -------
+    """
+    global _global_nbytes
+    _global_nbytes += delta
+    if counter is not None:
+        counter[0] += delta
+
+def set_global_budget(max_bytes):
+    """
+    Set the memory budget shared by the product caches of all satellites
+
+    Parameters
+    ----------
+    max_bytes : int or None
+        Memory budget (bytes), None to remove the global budget
+
+    Returns
+    -------
+    """
+    global _global_max_bytes
+    _global_max_bytes = max_bytes
+    _enforce_global_budget()
+
+def global_nbytes():
+    """
+    Memory held by the product caches of all satellites
+
+    Returns
+    -------
+    nbytes : int
+        Number of bytes held
+    """
+    return _global_nbytes
+
+def _enforce_global_budget(protect = None):
+    """
+    Drop the least recently used products across all caches until the
+    global memory budget is met
+
+    Parameters
+    ----------
+    protect = None : GridEntry
+        Entry in use by the caller, whose products are never dropped
+
+    Returns
+    -------
+    """
+    if _global_max_bytes is None or _global_nbytes <= _global_max_bytes:
+        return
+    total = _global_nbytes
+
+    # (last use, cache, key, product name) for every droppable product
+    products = []
+    for cache in list(_caches):
+        for key, entry in cache._entries.items():
+            if entry is protect:
+                continue
+            for name in entry.keys():
+                # Keys such as "frame_key" and views owned elsewhere free
+                # nothing when dropped
+                if name != "times" and entry.product_nbytes(name) > 0:
+                    products.append((entry.last_used[name], id(cache), cache,
+                                     key, name))
+    products.sort(key = lambda item: item[:2])
+
+    for _, _, cache, key, name in products:
+        if total <= _global_max_bytes:
+            break
+        entry = cache._entries.get(key)
+        if entry is None or name not in entry:
+            continue
+        total -= entry.product_nbytes(name)
+        entry.pop(name)
+        cache.drops += 1
+        if entry.nbytes == entry.product_nbytes("times"):
+            # Only the time grid is left holding memory
+            cache._detach(cache._entries.pop(key))
+
+def grid_key(times):
+    """
+    Build a descriptor identifying a time grid
+
+    Parameters
+    ----------
+    times : np.array
+        Array of timesteps (s)
+
+    Returns
+    -------
+    key : tuple
+        ("uniform", start, step, count) for evenly spaced grids, otherwise
+        ("array", digest of the timesteps)
+    """
+    if len(times) >= 2:
+        steps = np.diff(times)
+        if steps[0] > 0 and np.allclose(steps, steps[0], rtol = 1e-9, atol = 0):
+            return ("uniform", float(times[0]), float(steps[0]), len(times))
+    return ("array", hashlib.sha1(np.ascontiguousarray(times).tobytes()).hexdigest())
+
+class RelativeArray:
+    def __init__(self, values):
+        """
+        Compact encoding of a (T, k) array as float32 offsets from a float64
+        reference trajectory, linear between reference samples. References
+        are spaced as far apart as possible while keeping every offset below
+        RELATIVE_MAX_OFFSET
+
+        Parameters
+        ----------
+        values : array
+            Array to encode
+
+        Returns
+        -------
+        """
+        self.length = len(values)
+        block = RELATIVE_MAX_BLOCK
+        while True:
+            self.block = block
+            self.references = values[self._ref_idx()].copy()
+            offsets = values - self._reference()
+            if block == 1 or np.max(np.abs(offsets)) <= RELATIVE_MAX_OFFSET:
+                break
+            block //= 2
+        self.offsets = offsets.astype(np.float32)
+
+    def _ref_idx(self):
+        return np.unique(np.r_[np.arange(0, self.length, self.block),
+                               self.length - 1])
+
+    def _reference(self):
+        # Linear interpolation between the reference samples
+        samples = np.arange(self.length)
+        ref_idx = self._ref_idx()
+        return np.column_stack([np.interp(samples, ref_idx, self.references[:, k])
+                                for k in range(self.references.shape[1])])
+
+    @property
+    def nbytes(self):
+        return self.references.nbytes + self.offsets.nbytes
+
+    def decode(self):
+        return self._reference() + self.offsets.astype(np.float64)
+
+class Float32Array:
+    def __init__(self, values):
+        """
+        Single precision copy of an array
+
+        Parameters
+        ----------
+        values : array
+            Array to encode
+
+        Returns
+        -------
+        """
+        self.values = np.asarray(values, dtype = np.float32)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def decode(self):
+        return self.values.astype(np.float64)
+
+def encode(name, value, storage):
+    """
+    Encode a product according to a storage policy
+
+    Parameters
+    ----------
+    name : str
+        Name of the product
+    value : array
+        Product computed in float64
+    storage : str
+        Storage policy, one of STORAGE_POLICIES
+
+    Returns
+    -------
+    stored : array, Float32Array or RelativeArray
+        Encoded product
+    """
+    if (storage == "float64" or name == "times" or not isinstance(value, np.ndarray)
+        or value.dtype != np.float64):
+        return value
+    relative = name in RELATIVE_PRODUCTS or name.startswith(RELATIVE_PREFIXES)
+    if (storage == "relative" and relative and value.ndim == 2
+        and np.all(np.isfinite(value))):
+        return RelativeArray(value)
+    return Float32Array(value)
+
+class GridEntry:
+    def __init__(self, products, storage = "float64"):
+        """
+        Products computed on one time grid, stored according to a storage
+        policy. Behaves like a dict whose values are float64 arrays
+
+        Parameters
+        ----------
+        products : dict
+            Products computed on the grid, including "times"
+        storage = "float64" : str
+            Storage policy, one of STORAGE_POLICIES
+
+        Returns
+        -------
+        """
+        self.storage = storage
+        self._stored = {}
+        self.last_used = {}
+        self._nbytes = 0
+        # Bytes counted for each product when it was stored. Storing the same
+        # object again (e.g. a container which has grown) recounts it
+        self._sizes = {}
+        # Byte counter of the ProductCache holding the entry, if any
+        self.counter = None
+        for name, value in products.items():
+            self[name] = value
+
+    def __getitem__(self, name):
+        stored = self._stored[name]
+        self.last_used[name] = next(_clock)
+        if isinstance(stored, (Float32Array, RelativeArray)):
+            return stored.decode()
+        return stored
+
+    def __setitem__(self, name, value):
+        delta = -self._sizes.get(name, 0)
+        self._stored[name] = encode(name, value, self.storage)
+        self.last_used[name] = next(_clock)
+        self._sizes[name] = self._measure(name)
+        self._adjust(delta + self._sizes[name])
+
+    def __contains__(self, name):
+        return name in self._stored
+
+    def __len__(self):
+        return len(self._stored)
+
+    def keys(self):
+        return list(self._stored.keys())
+
+    def pop(self, name, default = None):
+        if name not in self._stored:
+            return default
+        self._adjust(-self._sizes.pop(name))
+        self.last_used.pop(name, None)
+        return self._stored.pop(name)
+
+    def _adjust(self, delta):
+        self._nbytes += delta
+        if self.counter is not None:
+            _count_bytes(delta, self.counter)
+
+    def _measure(self, name):
+        # Views into arrays owned elsewhere (e.g. a SatelliteFleet buffer)
+        # are not counted
+        stored = self._stored[name]
+        if isinstance(stored, np.ndarray):
+            return stored.nbytes if stored.base is None else 0
+        return getattr(stored, "nbytes", 0)
+
+    def product_nbytes(self, name):
+        """
+        Memory held by one product, as counted when it was last stored
+
+        Parameters
+        ----------
+        name : str
+            Name of the product
+
+        Returns
+        -------
+        nbytes : int
+            Number of bytes owned by the product
+        """
+        return self._sizes[name]
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+class ProductCache:
+    def __init__(self, max_bytes = DEFAULT_MAX_BYTES, storage = "float64"):
+        """
+        Least recently used cache holding the products (positions,
+        velocities, ECEF, ...) of several time grids at once
+
+        Parameters
+        ----------
+        max_bytes = DEFAULT_MAX_BYTES : int
+            Memory budget (bytes). The most recently used grid is always
+            kept, even if it alone exceeds the budget
+        storage = "float64" : str
+            Storage policy of the cached products, one of STORAGE_POLICIES
+
+        Returns
+        -------
+        """
+        if storage not in STORAGE_POLICIES:
+            raise ValueError(f"Unknown storage policy: {storage}")
+
+        self.max_bytes = max_bytes
+        self.storage = storage
+        self._entries = OrderedDict()
+        _caches.add(self)
+        
+        # Bytes held, in a list shared with the entries so that they can
+        # update it, and released from the global total when the cache dies
+        self._counter = [0]
+        weakref.finalize(self, lambda counter: _count_bytes(-counter[0]), 
+                         self._counter)
+
+        # Counters reported by stats()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.drops = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._counter[0]
+
+    def _wrap(self, entry):
+        if isinstance(entry, GridEntry):
+            return entry
+        return GridEntry(entry, self.storage)
+
+    def _attach(self, key, entry):
+        # Store an entry and count its bytes
+        old = self._entries.get(key)
+        if old is entry:
+            return
+        if old is not None:
+            self._detach(old)
+        entry.counter = self._counter
+        _count_bytes(entry.nbytes, self._counter)
+        self._entries[key] = entry
+
+    def _detach(self, entry):
+        # Stop counting the bytes of an entry removed from the cache
+        if entry.counter is self._counter:
+            _count_bytes(-entry.nbytes, self._counter)
+            entry.counter = None
+        return entry
+
+    def get(self, times):
+        """
+        Retrieve the products of a time grid and mark them as recently used
+
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+
+        Returns
+        -------
+        entry : GridEntry or None
+            Products of the grid, None if the grid is not cached
+        """
+        key = grid_key(times)
+        entry = self._entries.get(key)
+        if entry is None or not np.array_equal(entry["times"], times):
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, times, entry):
+        """
+        Store the products of a time grid as the most recently used
+
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+        entry : dict or GridEntry
+            Products computed on the grid, including "times"
+
+        Returns
+        -------
+        entry : GridEntry
+            Stored products
+        """
+        key = grid_key(times)
+        entry = self._wrap(entry)
+        self._attach(key, entry)
+        self._entries.move_to_end(key)
+        self.trim()
+        return entry
+
+    def find_containing(self, times):
+        """
+        Find a cached grid of which a new grid is a contiguous slice, so that
+        its products can be sliced instead of computed again. The cached grid
+        is kept
+
+        Parameters
+        ----------
+        times : np.array
+            New array of timesteps (s)
+
+        Returns
+        -------
+        found : tuple or None
+            (entry, lo, hi) such that entry["times"][lo:hi] equals times, or
+            None if no cached grid contains it. The smallest such grid is
+            chosen
+        """
+        if len(times) == 0:
+            return None
+        best = None
+        for key, entry in self._entries.items():
+            cached = entry["times"]
+            if len(cached) <= len(times):
+                continue
+            lo = int(np.searchsorted(cached, times[0]))
+            hi = lo + len(times)
+            if hi > len(cached) or not np.array_equal(cached[lo:hi], times):
+                continue
+            if best is None or len(cached) < len(best[0]["times"]):
+                best = (entry, lo, hi)
+        return best
+
+    def pop_contained(self, times):
+        """
+        Remove and return a cached grid which is a prefix, suffix or
+        contiguous slice of a new grid, so that it can be extended
+
+        Parameters
+        ----------
+        times : np.array
+            New array of timesteps (s)
+
+        Returns
+        -------
+        found : tuple or None
+            (entry, lo, hi) such that times[lo:hi] equals entry["times"], or
+            None if no cached grid fits. The largest fitting grid is chosen
+        """
+        best = None
+        for key, entry in self._entries.items():
+            cached = entry["times"]
+            if len(cached) == 0 or len(cached) > len(times):
+                continue
+            lo = int(np.searchsorted(times, cached[0]))
+            hi = lo + len(cached)
+            if hi > len(times) or not np.array_equal(times[lo:hi], cached):
+                continue
+            if best is None or len(cached) > best[2] - best[1]:
+                best = (key, lo, hi)
+
+        if best is None:
+            return None
+        key, lo, hi = best
+        return self._detach(self._entries.pop(key)), lo, hi
+
+    def remap(self, func):
+        """
+        Replace every cached grid by func(entry), dropping the grids for
+        which func returns None. The usage order is preserved
+
+        Parameters
+        ----------
+        func : callable
+            Function taking a GridEntry and returning a dict of products
+
+        Returns
+        -------
+        """
+        for key in list(self._entries):
+            entry = func(self._entries[key])
+            if entry is None:
+                self._detach(self._entries.pop(key))
+            else:
+                self._attach(key, self._wrap(entry))
+        self.trim()
+
+    def trim(self):
+        """
+        Evict least recently used grids until the memory budget is met, then
+        apply the global budget
+
+        Returns
+        -------
+        """
+        while len(self._entries) > 1 and self.nbytes > self.max_bytes:
+            self._detach(self._entries.popitem(last = False)[1])
+            self.evictions += 1
+
+        # The most recently used grid is the one being worked on
+        current = next(reversed(self._entries.values()), None)
+        _enforce_global_budget(protect = current)
+
+    def clear(self):
+        """
+        Drop every cached grid
+
+        Returns
+        -------
+        """
+        for entry in self._entries.values():
+            self._detach(entry)
+        self._entries.clear()
+
+    def stats(self):
+        """
+        Report the state of the cache
+
+        Returns
+        -------
+        stats : dict
+            Number of grids, bytes held, byte budget, storage policy, hits,
+            misses, evicted grids and products dropped by the global budget
+        """
+        return {"grids": len(self._entries),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "storage": self.storage,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "drops": self.drops}
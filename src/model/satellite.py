@@ -1,26 +1,155 @@
 import numpy as np
-from org.orekit.orbits import KeplerianOrbit, PositionAngleType
-from org.orekit.frames import FramesFactory
-from org.orekit.utils import Constants, IERSConventions
-from org.orekit.propagation.analytical import KeplerianPropagator
-from org.orekit.bodies import OneAxisEllipsoid
-from org.hipparchus.geometry.euclidean.threed import Vector3D
-from org.orekit.time import AbsoluteDate, TimeScalesFactory
-from scipy.spatial.transform import Rotation as R
+import src.model.kepler as kepler
+import src.model.interpolation as interpolation
+import src.model.frames as frames
+import src.model.decimation as decimation
+import src.model.attitude as attitude
+from src.model.frames import WGS84_EARTH_MU
+from src.model.orekit_env import ensure_vm
+from src.model.product_cache import ProductCache, DEFAULT_MAX_BYTES
 
 """
-Define frames of reference for the coordinate systems, and generate an
-elliptical model for the Earth
+Available propagation backends. "orekit" is the reference mode which samples
+KeplerianPropagator during a single propagation run, "numpy" solves Kepler's
+equation for the whole time array at once (see kepler.POSITION_TOLERANCE for
+the agreement with "orekit") and "j2" adds the J2 secular drift of the node,
+periapsis and mean anomaly to the "numpy" solution. "numerical" integrates
+the orbit with Orekit's NumericalPropagator in the gravity field shipped in
+data/.../Potential, truncated to the satellite's degree and order.
 """
-inertial = FramesFactory.getEME2000()
-earth_fixed = FramesFactory.getITRF(IERSConventions.IERS_2010, True)
+PROPAGATION_MODES = ("orekit", "numpy", "j2", "numerical")
 
-earth_ellipsoid = OneAxisEllipsoid(Constants.WGS84_EARTH_EQUATORIAL_RADIUS,
-                                   Constants.WGS84_EARTH_FLATTENING,
-                                   earth_fixed)
+# Unnormalized J2 and its reference radius used by the "j2" mode, equal to
+# -Constants.EGM96_EARTH_C20 and Constants.EGM96_EARTH_EQUATORIAL_RADIUS
+EARTH_J2 = 1.08262668355315e-3
+EARTH_J2_RADIUS = 6378136.3             # m
+
+# Settings of the adaptive integrator used by the "numerical" mode
+NUMERICAL_POSITION_TOLERANCE = 1e-3     # m
+NUMERICAL_MIN_STEP = 1e-3               # s
+NUMERICAL_MAX_STEP = 300.0              # s
+
+"""
+With an ephemeris_tolerance set, the propagator is only evaluated at coarse
+nodes and the requested grid is filled by Hermite interpolation. The error is
+checked against the propagator at ERROR_CHECK_SAMPLES random samples, halving
+the node spacing until it is within the tolerance. The samples are drawn with a
+fixed seed so that identical inputs always give the same nodes
+"""
+ERROR_CHECK_SAMPLES = 16
+ERROR_CHECK_SEED = 0
+
+# Default of update_orbit arguments whose None value has a meaning
+_UNCHANGED = object()
+
+"""
+For two-body modes, changing only the anomaly or the epoch is a pure time shift
+of the same trajectory, so update_orbit remaps the cached inertial products
+instead of repropagating. Shifts that are not a whole number of timesteps are
+resampled by Hermite interpolation when its error estimate is below
+PHASE_SHIFT_TOLERANCE (m)
+"""
+PHASE_SHIFT_MODES = ("orekit", "numpy")
+PHASE_SHIFT_TOLERANCE = 1e-3
+
+"""
+Products derived from the propagated positions, each with the product it is
+computed from (poses -> ecef -> lla -> gtc -> gtc_lod, the level of detail
+pyramid of the ground track, and ecef -> ecef_vels which also
+uses the inertial velocities). Every product is computed lazily
+the first time it, or one of its descendants, is requested, and invalidating
+a product only drops its descendants. All of them are built from rotation
+stacks, so each grid records the frames.frame_generation they were built with
+as "frame_key" and drops them when the frame settings change
+"""
+PRODUCT_PARENTS = {"ecef": "poses", "lla": "ecef", "gtc": "lla",
+                   "gtc_lod": "gtc", "ecef_vels": "ecef"}
+
+# Positions in the other output frames of get_positions, e.g. "poses_gcrf"
+for _frame in frames.OUTPUT_FRAMES:
+    if _frame not in ("EME2000", "ITRF"):
+        PRODUCT_PARENTS[f"poses_{_frame.lower()}"] = "poses"
+
+_state_recorder = None
+
+def _state_recorder_class():
+    """
+    Build, on first use, the fixed step handler class which writes the
+    states produced during a single Orekit propagation straight into
+    preallocated NumPy buffers. Its Orekit base class only exists once the
+    virtual machine is running
+    
+    Returns
+    -------
+    _StateRecorder : type
+        Step handler class
+    """
+    global _state_recorder
+    if _state_recorder is not None:
+        return _state_recorder
+    
+    from org.orekit.propagation.sampling import PythonOrekitFixedStepHandler
+    
+    class _StateRecorder(PythonOrekitFixedStepHandler):
+        def __init__(self, start, step, poses, vels):
+            super().__init__()
+            self.start = start
+            self.step = step
+            self.poses = poses
+            self.vels = vels
+            self.filled = np.zeros(len(poses), dtype = bool)
+        
+        def init(self, s0, t, step):
+            pass
+    
+        def handleStep(self, state):
+            self._record(state)
+        
+        def finish(self, state):
+            # The final state may fall on the last sample of the grid
+            self._record(state)
+        
+        def _record(self, state):
+            # Map the state date back onto its index in the time grid
+            idx = int(round(state.getDate().durationFrom(self.start) / self.step))
+            if 0 <= idx < len(self.poses) and not self.filled[idx]:
+                pv = state.getPVCoordinates()
+                pos, vel = pv.getPosition(), pv.getVelocity()
+                self.poses[idx, :] = pos.getX(), pos.getY(), pos.getZ()
+                self.vels[idx, :] = vel.getX(), vel.getY(), vel.getZ()
+                self.filled[idx] = True
+    
+    _state_recorder = _StateRecorder
+    return _state_recorder
+
+def _uniform_step(times):
+    """
+    Return the step of an evenly spaced, increasing time grid
+    
+    Parameters
+    ----------
+    times : np.array
+        Array of timesteps (s)
+    
+    Returns
+    -------
+    step : float or None
+        Grid step (s), or None if the grid is not evenly spaced
+    """
+    if len(times) < 2:
+        return None
+    steps = np.diff(times)
+    step = float(steps[0])
+    if step <= 0 or not np.allclose(steps, step, rtol = 1e-9, atol = 0):
+        return None
+    return step
 
 class Satellite:
-    def __init__(self, a, e, i, omega, raan, anomaly, date, anomaly_type, label = "(no label)"):
+    def __init__(self, a, e, i, omega, raan, anomaly, date, anomaly_type, 
+                 label = "(no label)", propagation_mode = "orekit",
+                 gravity_degree = 8, gravity_order = 8,
+                 ephemeris_tolerance = None, cache_bytes = DEFAULT_MAX_BYTES,
+                 storage = "float64"):
         """
         Initialization function for the satellite class
 
@@ -44,6 +173,20 @@ class Satellite:
             Type of anomaly being used (TRUE, ECCENTRIC, MEAN)
         label = "No Label" : str
             Name of satellite
+        propagation_mode = "orekit" : str
+            Propagation backend, one of PROPAGATION_MODES
+        gravity_degree = 8 : int
+            Degree of the gravity field in "numerical" mode
+        gravity_order = 8 : int
+            Order of the gravity field in "numerical" mode
+        ephemeris_tolerance = None : float
+            Position error bound (m) of the interpolated ephemeris, None to
+            evaluate the propagator at every timestep
+        cache_bytes = DEFAULT_MAX_BYTES : int
+            Memory budget of the per-grid product cache (bytes)
+        storage = "float64" : str
+            Storage policy of cached products, one of 
+            product_cache.STORAGE_POLICIES
             
         Returns
         -------
@@ -53,37 +196,43 @@ class Satellite:
         self.omega, self.raan, self.anomaly = float(np.deg2rad(omega)), float(np.deg2rad(raan)), float(np.deg2rad(anomaly))
         self.anomaly_type = anomaly_type
         
+        ensure_vm()
+        from org.orekit.time import AbsoluteDate, TimeScalesFactory
+        
         utc = TimeScalesFactory.getUTC()
         epoch = AbsoluteDate(date[0], date[1], date[2], date[3], date[4], date[5], utc)
         self.epoch = epoch
         
         self.label = label
         
+        if propagation_mode not in PROPAGATION_MODES:
+            raise ValueError(f"Unknown propagation mode: {propagation_mode}")
+        self.propagation_mode = propagation_mode
+        self.gravity_degree = int(gravity_degree)
+        self.gravity_order = int(gravity_order)
+        self.ephemeris_tolerance = ephemeris_tolerance
+        
         # KeplarianOrbit is defined once per satellite class and then re-used
-        self.orbit = KeplerianOrbit(self.a, self.e, self.i, 
-                                    self.omega, self.raan, self.anomaly, 
-                                    PositionAngleType.valueOf(self.anomaly_type),
-                                    inertial, self.epoch, 
-                                    Constants.WGS84_EARTH_MU)
-        
-        # The same is done for KeplerianPropagator
-        self.propagator = KeplerianPropagator(self.orbit)
-        
-        # Initialize caches to empty
-        self._cache_times = None
-        self._cache_poses = None
-        self._cache_vels = None
-        self._cache_ecef = None
-        self._cache_lla = None
-        self._cache_gtc = None
-        self._cache_quats = None
+        self.orbit = self._build_orbit()
+        
+        # The same is done for the propagator
+        self.propagator = self._build_propagator()
+        
+        # Initialize caches to empty, products are kept for several time
+        # grids at once and the least recently used grid is evicted first
+        self._products = ProductCache(cache_bytes, storage)
         
         # This will be changed later if updated, useful for keys
         self._version = 0
+        
+        # Pointing modes over time, nadir pointing unless set_attitude is used
+        self.attitude = attitude.as_schedule(attitude.Nadir())
        
     # Update changes in orbital parameters
     def update_orbit(self, *, a = None, e = None, i = None, omega = None, 
-                     raan = None, anomaly = None, epoch = None, anomaly_type = None):
+                     raan = None, anomaly = None, epoch = None, anomaly_type = None,
+                     propagation_mode = None, gravity_degree = None, 
+                     gravity_order = None, ephemeris_tolerance = _UNCHANGED):
         """
         Updates satellite parameters
 
@@ -105,10 +254,27 @@ class Satellite:
             Start time of simulation (date).
         anomaly_type = None : str
             Type of anomaly being used (TRUE, ECCENTRIC, MEAN)
+        propagation_mode = None : str
+            Propagation backend, one of PROPAGATION_MODES
+        gravity_degree = None : int
+            Degree of the gravity field in "numerical" mode
+        gravity_order = None : int
+            Order of the gravity field in "numerical" mode
+        ephemeris_tolerance = unchanged : float or None
+            Position error bound (m) of the interpolated ephemeris, None to
+            evaluate the propagator at every timestep
             
         Returns
         -------
         """
+        # Keep the previous state to check whether the trajectory is only
+        # shifted in time
+        old_shape = (self.a, self.e, self.i, self.omega, self.raan, 
+                     self.propagation_mode, self.gravity_degree, 
+                     self.gravity_order, self.ephemeris_tolerance)
+        old_M0 = kepler.mean_anomaly(self.anomaly, self.e, self.anomaly_type)
+        old_epoch = self.epoch
+        
         changed = False
         # Check if any parameters have been updated
         if a is not None and a != self.a:
@@ -135,31 +301,225 @@ class Satellite:
         if anomaly_type is not None and anomaly_type != self.anomaly_type:
             self.anomaly_type = anomaly_type
             changed = True
+        if (propagation_mode is not None 
+            and propagation_mode != self.propagation_mode):
+            if propagation_mode not in PROPAGATION_MODES:
+                raise ValueError(f"Unknown propagation mode: {propagation_mode}")
+            self.propagation_mode = propagation_mode
+            changed = True
+        if gravity_degree is not None and gravity_degree != self.gravity_degree:
+            self.gravity_degree = int(gravity_degree)
+            changed = True
+        if gravity_order is not None and gravity_order != self.gravity_order:
+            self.gravity_order = int(gravity_order)
+            changed = True
+        if (ephemeris_tolerance is not _UNCHANGED 
+            and ephemeris_tolerance != self.ephemeris_tolerance):
+            self.ephemeris_tolerance = ephemeris_tolerance
+            changed = True
             
         if not changed:
             return
            
         # Re-define self.orbit
-        self.orbit = KeplerianOrbit(self.a, self.e, self.i, 
-                                    self.omega, self.raan, self.anomaly, 
-                                    PositionAngleType.valueOf(self.anomaly_type),
-                                    inertial, self.epoch, 
-                                    Constants.WGS84_EARTH_MU)
-        
-        # The same is done for KeplerianPropagator
-        self.propagator = KeplerianPropagator(self.orbit)
-        
-        # Change caches to empty
-        self._cache_times = None
-        self._cache_poses = None
-        self._cache_vels = None
-        self._cache_ecef = None
-        self._cache_lla = None
-        self._cache_gtc = None
-        self._cache_quats = None
+        self.orbit = self._build_orbit()
+        
+        # The same is done for the propagator
+        self.propagator = self._build_propagator()
+        
+        new_shape = (self.a, self.e, self.i, self.omega, self.raan, 
+                     self.propagation_mode, self.gravity_degree, 
+                     self.gravity_order, self.ephemeris_tolerance)
+        if new_shape == old_shape and self.propagation_mode in PHASE_SHIFT_MODES:
+            # Same orbit, only the phase along it (or the epoch) changed
+            self._phase_shift(old_M0, self.epoch != old_epoch)
+        else:
+            # Change caches to empty
+            self._products.clear()
         
         self._version += 1
         
+    def _phase_shift(self, old_M0, epoch_changed):
+        """
+        Remap cached inertial products after a change of anomaly or epoch
+        
+        Parameters
+        ----------
+        old_M0 : float
+            Mean anomaly at epoch before the update (radian)
+        epoch_changed : bool
+            Whether the epoch was updated
+        
+        Returns
+        -------
+        """
+        # Positions at time t now match the previous positions at t + shift
+        n = np.sqrt(WGS84_EARTH_MU / self.a**3)
+        new_M0 = kepler.mean_anomaly(self.anomaly, self.e, self.anomaly_type)
+        dM = np.mod(new_M0 - old_M0 + np.pi, 2 * np.pi) - np.pi
+        shift = float(dM / n)
+        
+        # Only nadir attitude follows the orbit, other modes are recomputed
+        kept = ("times", "poses", "vels")
+        if attitude.is_nadir(self.attitude):
+            kept += ("quats", "attitude_key")
+        
+        def remap(entry):
+            times = entry["times"]
+            if "poses" not in entry or "vels" not in entry:
+                return None
+            # Inertial products (and nadir attitude) only depend on the phase,
+            # Earth-fixed ones also depend on the absolute date
+            if shift == 0:
+                if not epoch_changed:
+                    return entry
+                return {name: entry[name] for name in kept if name in entry}
+            entry = {name: entry[name] for name in kept if name in entry}
+            
+            step = _uniform_step(times)
+            if step is not None and abs(shift / step - round(shift / step)) < 1e-9:
+                return self._shift_entry(entry, int(round(shift / step)))
+            
+            if len(times) < 2:
+                return None
+            max_step = step if step is not None else float(np.max(np.diff(times)))
+            error = kepler.hermite_error_bound(self.a, self.e, 
+                                               WGS84_EARTH_MU, max_step)
+            if error > PHASE_SHIFT_TOLERANCE:
+                return None
+            return self._resample_entry(entry, shift)
+        
+        self._products.remap(remap)
+    
+    def _shift_entry(self, entry, k):
+        """
+        Shift cached inertial products by a whole number of samples
+        
+        Parameters
+        ----------
+        entry : dict
+            Products computed on a time grid
+        k : int
+            New sample j takes the previous sample j + k
+        
+        Returns
+        -------
+        new_entry : dict
+            Shifted products, samples shifted in from outside the grid are
+            propagated
+        """
+        times = entry["times"]
+        count = len(times)
+        src = np.arange(count) + k
+        valid = (src >= 0) & (src < count)
+        missing = np.where(~valid)[0]
+        
+        new_entry = {"times": times}
+        poses = np.empty((count, 3))
+        vels = np.empty((count, 3))
+        poses[valid] = entry["poses"][src[valid]]
+        vels[valid] = entry["vels"][src[valid]]
+        if len(missing):
+            poses[missing], vels[missing] = self._compute_pv(times[missing])
+        new_entry["poses"], new_entry["vels"] = poses, vels
+        
+        if "quats" in entry and "attitude_key" in entry:
+            quats = np.empty((count, 4))
+            quats[valid] = entry["quats"][src[valid]]
+            quats[missing] = self._compute_quats(times[missing], poses[missing], 
+                                                 vels[missing])
+            new_entry["quats"] = quats
+            new_entry["attitude_key"] = entry["attitude_key"]
+            
+        return new_entry
+    
+    def _resample_entry(self, entry, shift):
+        """
+        Resample cached inertial products at times shifted by a fraction of
+        a timestep, using Hermite interpolation of positions and velocities
+        
+        Parameters
+        ----------
+        entry : dict
+            Products computed on a time grid
+        shift : float
+            New sample at t takes the previous trajectory at t + shift (s)
+        
+        Returns
+        -------
+        new_entry : dict
+            Resampled inertial products
+        """
+        times = entry["times"]
+        shifted = times + shift
+        inside = (shifted >= times[0]) & (shifted <= times[-1])
+        
+        poses = np.empty((len(times), 3))
+        vels = np.empty((len(times), 3))
+        poses[inside], vels[inside] = interpolation.hermite(
+            times, entry["poses"], entry["vels"], shifted[inside])
+        if not np.all(inside):
+            poses[~inside], vels[~inside] = self._compute_pv(times[~inside])
+        
+        return {"times": times, "poses": poses, "vels": vels}
+        
+    def _build_orbit(self):
+        """
+        Build the Orekit orbit from the current elements
+        
+        Returns
+        -------
+        orbit : KeplerianOrbit
+            Orbit in the inertial frame at the epoch
+        """
+        from org.orekit.orbits import KeplerianOrbit, PositionAngleType
+        
+        return KeplerianOrbit(self.a, self.e, self.i, 
+                              self.omega, self.raan, self.anomaly, 
+                              PositionAngleType.valueOf(self.anomaly_type),
+                              frames.get_frame("inertial"), self.epoch, 
+                              WGS84_EARTH_MU)
+    
+    def _build_propagator(self):
+        """
+        Build the Orekit propagator used by the "orekit" and "numerical" modes
+        
+        Returns
+        -------
+        propagator : orekit.propagation.Propagator
+            KeplerianPropagator, or a NumericalPropagator with an adaptive
+            Dormand-Prince integrator and a Holmes-Featherstone gravity field
+            for the "numerical" mode
+        """
+        if self.propagation_mode != "numerical":
+            from org.orekit.propagation.analytical import KeplerianPropagator
+            return KeplerianPropagator(self.orbit)
+        
+        from orekit import JArray_double
+        from org.orekit.orbits import OrbitType
+        from org.orekit.propagation import SpacecraftState
+        from org.orekit.propagation.numerical import NumericalPropagator
+        from org.orekit.forces.gravity import HolmesFeatherstoneAttractionModel
+        from org.orekit.forces.gravity.potential import GravityFieldFactory
+        from org.hipparchus.ode.nonstiff import DormandPrince853Integrator
+        
+        tolerances = NumericalPropagator.tolerances(NUMERICAL_POSITION_TOLERANCE,
+                                                    self.orbit, OrbitType.CARTESIAN)
+        integrator = DormandPrince853Integrator(NUMERICAL_MIN_STEP, 
+                                                NUMERICAL_MAX_STEP,
+                                                JArray_double.cast_(tolerances[0]),
+                                                JArray_double.cast_(tolerances[1]))
+        
+        propagator = NumericalPropagator(integrator)
+        propagator.setOrbitType(OrbitType.CARTESIAN)
+        gravity_field = GravityFieldFactory.getNormalizedProvider(self.gravity_degree,
+                                                                  self.gravity_order)
+        propagator.addForceModel(HolmesFeatherstoneAttractionModel(frames.get_frame("earth_fixed"), 
+                                                                   gravity_field))
+        propagator.setInitialState(SpacecraftState(self.orbit))
+        
+        return propagator
+    
     # Define a method that will propagate over time
     def propagate(self, times):
         """
@@ -172,37 +532,370 @@ class Satellite:
         
         Returns
         -------
-        _cache_poses : array
+        poses : array
             Array of positions in 3D (m, m, m)
         """
-        # If we have not yet run propagate or the time input has changed:
-        if (self._cache_times is None 
-            or not np.array_equal(times, self._cache_times)):
+        return self._entry(times)["poses"]
+    
+    def _entry(self, times):
+        """
+        Retrieve the cached products of a time grid, propagating it first if
+        it has not been seen before
+        
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+        
+        Returns
+        -------
+        entry : dict
+            Products computed on the grid ("times", "poses", "vels", and any
+            of "ecef", "lla", "gtc", "quats" computed so far)
+        """
+        entry = self._products.get(times)
+        if entry is None:
+            # If a cached grid contains the new one, slice its products. If
+            # the new grid contains a cached one, only compute the samples
+            # that are missing
+            containing = self._products.find_containing(times)
+            contained = None
+            if containing is None:
+                contained = self._products.pop_contained(times)
+            if containing is not None:
+                entry = self._slice_entry(*containing)
+            elif contained is not None:
+                entry = self._extend_entry(times, *contained)
+            else:
+                poses, vels = self._compute_pv(times)
+                entry = {"times": times.copy(), "poses": poses, "vels": vels}
             
-            # Cache the new times input
-            self._cache_times = times.copy()
-        
-            # Generate an empty matrix to store positions over time
-            poses = np.zeros((len(times), 3))
-            vels = np.zeros((len(times), 3))
-            for idx, elapsed in enumerate(times):
-                # Find the positions of the satellite at each timestep and add
-                # each position vector as an entry in the poses matrix
-                current_state = self.propagator.propagate(self.epoch.shiftedBy(float(elapsed)))
-                current_pos = current_state.getPVCoordinates().getPosition()
-                current_vel = current_state.getPVCoordinates().getVelocity()
-                poses[idx, :] = current_pos.getX(), current_pos.getY(), current_pos.getZ()
-                vels[idx, :] = current_vel.getX(), current_vel.getY(), current_vel.getZ()
+            entry = self._products.put(times, entry)
             
-            # Cache poses and invalidate down-the-line previously cached vars
-            self._cache_poses = poses
-            self._cache_vels = vels
-            self._cache_ecef = None
-            self._cache_lla = None
-            self._cache_gtc = None
-            self._cache_quats = None
+        elif "poses" not in entry or "vels" not in entry:
+            # Dropped to meet the global memory budget
+            entry["poses"], entry["vels"] = self._compute_pv(times)
+            self._products.trim()
             
-        return self._cache_poses
+        return entry
+    
+    def _slice_entry(self, old, lo, hi):
+        """
+        Take the products of a new time grid from a cached grid containing
+        it. The slices are copied, so that the memory of each grid is
+        counted, and evicted, on its own
+        
+        Parameters
+        ----------
+        old : dict
+            Products of the cached grid
+        lo : int
+            Index of the first sample of the new grid within the cached one
+        hi : int
+            Index after the last sample of the new grid within the cached one
+        
+        Returns
+        -------
+        entry : dict
+            Products on the new grid
+        """
+        self._check_frames(old)
+        entry = {}
+        for name in old.keys():
+            # Ground tracks and their pyramids depend on the neighbouring
+            # samples, so they are recomputed from lla on demand
+            if name in ("gtc", "gtc_lod"):
+                continue
+            value = old[name]
+            if isinstance(value, np.ndarray):
+                entry[name] = value[lo:hi].copy()
+            else:
+                # Keys the products were built with, e.g. "attitude_key"
+                entry[name] = value
+        
+        if "poses" not in entry or "vels" not in entry:
+            # Inertial products were dropped, propagate the new grid
+            entry["poses"], entry["vels"] = self._compute_pv(entry["times"])
+        return entry
+    
+    def _extend_entry(self, times, old, lo, hi):
+        """
+        Extend every product of a cached grid onto a new time grid which
+        contains it, computing only the samples that are missing
+        
+        Parameters
+        ----------
+        times : np.array
+            New array of timesteps (s)
+        old : dict
+            Products of the cached grid
+        lo : int
+            Index of the first cached sample within times
+        hi : int
+            Index after the last cached sample within times
+        
+        Returns
+        -------
+        entry : dict
+            Products on the new grid
+        """
+        # Samples missing before and after the cached grid
+        segments = [times[:lo], times[hi:]]
+        
+        if "poses" in old and "vels" in old:
+            new_pv = [self._compute_pv(seg) if len(seg) else (np.zeros((0, 3)),) * 2
+                      for seg in segments]
+            new_poses = [pv[0] for pv in new_pv]
+            new_vels = [pv[1] for pv in new_pv]
+            poses = np.concatenate([new_poses[0], old["poses"], new_poses[1]])
+            vels = np.concatenate([new_vels[0], old["vels"], new_vels[1]])
+        else:
+            # Inertial products were dropped, propagate the whole grid
+            poses, vels = self._compute_pv(times)
+            new_poses = [poses[:lo], poses[hi:]]
+            new_vels = [vels[:lo], vels[hi:]]
+        
+        entry = {"times": times.copy(), "poses": poses, "vels": vels}
+        
+        # Extend each derived product whose parent could be extended, unless
+        # it was built with older frame settings
+        new_parts = {"poses": new_poses}
+        if self._check_frames(old):
+            entry["frame_key"] = old["frame_key"]
+        for name in ("ecef", "lla"):
+            parent = PRODUCT_PARENTS[name]
+            if name in old and parent in new_parts:
+                new_parts[name] = [self._derive(name, seg, part) 
+                                   for seg, part in zip(segments, new_parts[parent])]
+                entry[name] = np.concatenate([new_parts[name][0], old[name], 
+                                              new_parts[name][1]])
+            
+        if "quats" in old and "attitude_key" in old:
+            entry["quats"] = np.concatenate([
+                self._compute_quats(segments[0], new_poses[0], new_vels[0]),
+                old["quats"],
+                self._compute_quats(segments[1], new_poses[1], new_vels[1])])
+            entry["attitude_key"] = old["attitude_key"]
+        
+        # Ground tracks and their decimation pyramids depend on the
+        # neighbouring samples, so they are recomputed from lla on demand
+        return entry
+    
+    def _seed_pv(self, times, poses, vels):
+        """
+        Fill the inertial caches with externally computed positions and
+        velocities (used by SatelliteFleet after a fleet-wide propagation)
+        
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+        poses : array
+            Array of positions in 3D (m, m, m)
+        vels : array
+            Array of velocities in 3D (m s^-1, m s^-1, m s^-1)
+        
+        Returns
+        -------
+        """
+        if self._products.get(times) is None:
+            self._products.put(times, {"times": times.copy(), 
+                                       "poses": poses, "vels": vels})
+    
+    def _seed_product(self, times, name, value):
+        """
+        Fill a derived product with an externally computed value (used by
+        SatelliteFleet after a fleet-wide computation), if the grid is cached
+        and the product is missing
+        
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+        name : str
+            Name of the product, a key of PRODUCT_PARENTS
+        value : array
+            Product on the timesteps
+        
+        Returns
+        -------
+        """
+        entry = self._products.get(times)
+        if entry is not None:
+            self._check_frames(entry)
+            if name not in entry:
+                entry[name] = value
+    
+    def _check_frames(self, entry):
+        """
+        Drop the derived products of a grid if they were built with older
+        frame settings (see frames.set_frame_mode)
+        
+        Parameters
+        ----------
+        entry : dict
+            Products computed on a time grid
+        
+        Returns
+        -------
+        current : bool
+            True if the derived products were kept
+        """
+        generation = frames.frame_generation()
+        if "frame_key" in entry and entry["frame_key"] == generation:
+            return True
+        for name in PRODUCT_PARENTS:
+            entry.pop(name, None)
+        entry["frame_key"] = generation
+        return False
+    
+    def cache_stats(self):
+        """
+        Report the state of the per-grid product cache
+        
+        Returns
+        -------
+        stats : dict
+            Number of grids, bytes held, byte budget, hits, misses and
+            evictions
+        """
+        return self._products.stats()
+    
+    def _compute_pv(self, times):
+        """
+        Compute inertial positions and velocities, through the interpolated
+        ephemeris if an ephemeris_tolerance is set
+        
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+        
+        Returns
+        -------
+        poses : array
+            Array of positions in 3D (m, m, m)
+        vels : array
+            Array of velocities in 3D (m s^-1, m s^-1, m s^-1)
+        """
+        times = np.asarray(times, dtype = float)
+        
+        # Nodes are laid out from the first to the last sample, so unsorted
+        # grids are propagated directly
+        if (self.ephemeris_tolerance is None or len(times) < 4 
+            or not np.all(np.diff(times) > 0)):
+            return self._propagate_pv(times)
+        
+        grid_step = float(np.min(np.diff(times)))
+        
+        # First guess for the node spacing from the two-body error estimate
+        step = kepler.hermite_node_step(self.a, self.e, WGS84_EARTH_MU,
+                                        self.ephemeris_tolerance)
+        rng = np.random.default_rng(ERROR_CHECK_SEED)
+        
+        while step > 2 * grid_step:
+            # Coarse nodes covering the whole grid
+            count = int(np.ceil((times[-1] - times[0]) / step)) + 1
+            nodes = times[0] + step * np.arange(count)
+            node_poses, node_vels = self._propagate_pv(nodes)
+            poses, vels = interpolation.hermite(nodes, node_poses, node_vels, times)
+            
+            # Compare against the propagator at random samples
+            check = np.sort(rng.choice(len(times), 
+                                       min(ERROR_CHECK_SAMPLES, len(times)),
+                                       replace = False))
+            exact_poses, _ = self._propagate_pv(times[check])
+            error = np.max(np.linalg.norm(exact_poses - poses[check], axis = 1))
+            if error <= self.ephemeris_tolerance:
+                return poses, vels
+            step /= 2
+        
+        # Nodes as dense as the grid itself bring no benefit
+        return self._propagate_pv(times)
+    
+    def _propagate_pv(self, times):
+        """
+        Compute inertial positions and velocities with the selected backend
+        
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+        
+        Returns
+        -------
+        poses : array
+            Array of positions in 3D (m, m, m)
+        vels : array
+            Array of velocities in 3D (m s^-1, m s^-1, m s^-1)
+        """
+        if self.propagation_mode == "numpy":
+            # Solve Kepler's equation for every timestep in one go
+            return kepler.propagate_kepler(self.a, self.e, self.i, 
+                                           self.omega, self.raan, self.anomaly,
+                                           self.anomaly_type, 
+                                           WGS84_EARTH_MU, times)
+        
+        if self.propagation_mode == "j2":
+            # Same solution with secularly drifting raan, omega and anomaly
+            return kepler.propagate_j2(self.a, self.e, self.i, 
+                                       self.omega, self.raan, self.anomaly,
+                                       self.anomaly_type, 
+                                       WGS84_EARTH_MU, EARTH_J2,
+                                       EARTH_J2_RADIUS, times)
+        
+        # Integrated propagators end up holding their final state, so numerical
+        # runs always start from a freshly built one, built once per call. Its
+        # ephemeris generator records the single integration, so that samples
+        # the step handler misses are read back without integrating again
+        propagator = self.propagator
+        generator = None
+        if self.propagation_mode == "numerical":
+            propagator = self._build_propagator()
+            generator = propagator.getEphemerisGenerator()
+        integrated = False
+        
+        # Generate empty matrices which Orekit fills in during a single run
+        poses = np.zeros((len(times), 3))
+        vels = np.zeros((len(times), 3))
+        filled = np.zeros(len(times), dtype = bool)
+        
+        step = _uniform_step(times)
+        if step is not None:
+            start = self.epoch.shiftedBy(float(times[0]))
+            end = self.epoch.shiftedBy(float(times[-1]))
+            recorder = _state_recorder_class()(start, step, poses, vels)
+            
+            # One propagation from start to end, sampled every step (for the
+            # numerical mode this samples the integrator's dense output)
+            propagator.setStepHandler(step, recorder)
+            try:
+                propagator.propagate(start, end)
+            finally:
+                propagator.clearStepHandlers()
+            filled = recorder.filled
+            integrated = True
+        elif generator is not None and len(times) > 1:
+            # Irregular grids are integrated once over their whole span
+            propagator.propagate(self.epoch.shiftedBy(float(np.min(times))),
+                                 self.epoch.shiftedBy(float(np.max(times))))
+            integrated = True
+        
+        missing = np.where(~filled)[0]
+        if integrated and generator is not None and len(missing):
+            # Read the remaining samples from the generated ephemeris
+            propagator = generator.getGeneratedEphemeris()
+        
+        # Irregular grids (or any sample the handler missed) are propagated
+        # one date at a time
+        for idx in missing:
+            current_state = propagator.propagate(self.epoch.shiftedBy(float(times[idx])))
+            current_pos = current_state.getPVCoordinates().getPosition()
+            current_vel = current_state.getPVCoordinates().getVelocity()
+            poses[idx, :] = current_pos.getX(), current_pos.getY(), current_pos.getZ()
+            vels[idx, :] = current_vel.getX(), current_vel.getY(), current_vel.getZ()
+        
+        return poses, vels
     
     def get_vels(self, times):
         """
@@ -215,76 +908,134 @@ class Satellite:
         
         Returns
         -------
-        _cache_vels : array
+        vels : array
             Array of velocities in 3D (m s^-1, m s^-1, m s^-1)
         """
-        self.propagate(times)
-        
-        return self._cache_vels
+        return self._entry(times)["vels"]
 
-    def _glob_to_cart(self, times):
+    def _derive(self, name, times, parent, vels = None):
         """
-        Transform ECI coordinates into cartesian, and ECEF coordinates
+        Compute one derived product from its parent product
         
         Parameters
         ----------
+        name : str
+            Name of the product, a key of PRODUCT_PARENTS
         times : np.array
             Array of timesteps (s)
+        parent : array
+            Parent product on the same timesteps
+        vels = None : array
+            Inertial velocities on the same timesteps, needed by "ecef_vels"
         
         Returns
         -------
-        ecef_poses : array
-            Array of positions in ECEF (m, m, m)
-        lla_poses : array
-            Array of longitude, latitude, altitude for satellite over time
-            (deg, deg, m)
-        """
-        poses = self.propagate(times)
-        # Generate an empty matrix to store positions over time
-        ecef_poses = np.zeros((len(times), 3))
-        lla_poses = np.zeros((len(times), 3))
-        
-        for idx, (time_offset, inertial_xyz) in enumerate(zip(times, poses)):
+        product : array
+            Derived product
+        """
+        if name == "ecef":
             # Change from EME2000() to ECEF positions which consider Earth's
-            # rotation, so that ground tracks can be extracted
-            current_date = self.epoch.shiftedBy(float(time_offset))
-            transformation = inertial.getTransformTo(earth_fixed, current_date)
-            inertial_vector = Vector3D(float(inertial_xyz[0]), 
-                                       float(inertial_xyz[1]), 
-                                       float(inertial_xyz[2]))
-            rotation = transformation.getRotation()
-            ecef_vector = rotation.applyTo(inertial_vector)
-            ecef_poses[idx, :] = ecef_vector.getX(), ecef_vector.getY(), ecef_vector.getZ()
-            
-            # With Earth Centered coordinates, cartesian coordinates can be
-            # computed for each Satellite.
-            geo_transformation = earth_ellipsoid.transform(ecef_vector,
-                                                           earth_fixed,
-                                                           self.epoch.shiftedBy(float(time_offset)))
-            lla_poses[idx,:] = (np.rad2deg(geo_transformation.getLatitude()),
-                                np.rad2deg(geo_transformation.getLongitude()),
-                                geo_transformation.getAltitude())
-        return ecef_poses, lla_poses
-   
-    def _ensure_converted(self, times):
+            # rotation, so that ground tracks can be extracted. The rotations
+            # of the whole grid are built at once and applied in one batch
+            rotations = frames.rotation_stack(self.epoch, times)
+            return frames.rotate(rotations, parent)
+        
+        if name.startswith("poses_"):
+            # Positions in another output frame, rotated in one batch
+            frame = name[len("poses_"):].upper()
+            rotations = frames.frame_rotation_stack(self.epoch, times, frame)
+            return frames.rotate(rotations, parent)
+        
+        if name == "ecef_vels":
+            # Rotated velocities minus the transport term of the Earth's
+            # rotation, for the whole grid in one pass
+            rotations = frames.rotation_stack(self.epoch, times)
+            rates = frames.rotation_rate_stack(self.epoch, times)
+            return frames.rotate(rotations, vels) - np.cross(rates, parent)
+        
+        if name == "lla":
+            # With Earth Centered coordinates, geodetic coordinates can be
+            # computed for the whole grid at once
+            return frames.ecef_to_lla(parent)
+        
+        if name == "gtc_lod":
+            # Decimated ground tracks for plotting, refined on zoom. The
+            # pyramid of each central meridian is built on first use by
+            # get_gtc_pyramid
+            return decimation.TrackPyramids()
+        
+        # Ground tracks: breaks at the antimeridian avoid horizontal lines
+        # across the map
+        return frames.ground_track(parent)
+    
+    def _product(self, times, name):
         """
-        Ensure conversion between reference frames has taken place
+        Retrieve a derived product, computing only the missing products
+        along its chain of parents
         
         Parameters
         ----------
         times : np.array
             Array of timesteps (s)
+        name : str
+            Name of the product, a key of PRODUCT_PARENTS
         
         Returns
         -------
+        product : array
+            Requested product
         """
-        poses = self.propagate(times)
-        # If no cache for ecef or lla, compute new ones
-        if self._cache_ecef is None or self._cache_lla is None:
-            ecef, lla = self._glob_to_cart(times)
-            self._cache_ecef = ecef
-            self._cache_lla = lla
-            self._cache_gtc = None
+        entry = self._entry(times)
+        self._check_frames(entry)
+        if name in entry:
+            return entry[name]
+        
+        # Walk up to the nearest product already available, then compute
+        # the missing ones back down
+        chain = [name]
+        while PRODUCT_PARENTS[chain[-1]] not in entry:
+            chain.append(PRODUCT_PARENTS[chain[-1]])
+        
+        # Each child is derived from the stored (decoded) parent and the
+        # stored value is returned, so that results do not depend on
+        # whether the cache was warm
+        value = entry[PRODUCT_PARENTS[chain[-1]]]
+        for child in reversed(chain):
+            vels = entry["vels"] if child == "ecef_vels" else None
+            entry[child] = self._derive(child, times, value, vels)
+            value = entry[child]
+        
+        self._products.trim()
+        return value
+    
+    def invalidate_product(self, name):
+        """
+        Drop a derived product and its descendants on every cached grid,
+        keeping the other products (e.g. invalidating "ecef" also drops
+        "lla" and "gtc" but keeps "quats")
+        
+        Parameters
+        ----------
+        name : str
+            Name of the product, a key of PRODUCT_PARENTS
+        
+        Returns
+        -------
+        """
+        names = {name}
+        while True:
+            children = {child for child, parent in PRODUCT_PARENTS.items()
+                        if parent in names} - names
+            if not children:
+                break
+            names |= children
+            
+        def remap(entry):
+            for product in names:
+                entry.pop(product, None)
+            return entry
+        
+        self._products.remap(remap)
    
     def get_ecef(self, times):
         """
@@ -297,11 +1048,56 @@ class Satellite:
         
         Returns
         -------
-        _cache_ecef : array
+        ecef : array
+            Array of ECEF positions (m, m, m)
+        """
+        return self._product(times, "ecef")
+         
+    def get_positions(self, times, frame = "EME2000"):
+        """
+        Retrieve positions over time in one of the supported frames
+        
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+        frame = "EME2000" : str
+            Output frame, one of frames.OUTPUT_FRAMES (EME2000, GCRF, MOD,
+            TOD, TEME, ITRF)
+        
+        Returns
+        -------
+        poses : array
+            Array of positions in the requested frame (m, m, m)
+        """
+        if frame not in frames.OUTPUT_FRAMES:
+            raise ValueError(f"Unknown output frame: {frame}")
+        if frame == "EME2000":
+            return self.propagate(times)
+        if frame == "ITRF":
+            return self.get_ecef(times)
+        return self._product(times, f"poses_{frame.lower()}")
+    
+    def get_ecef_pv(self, times):
+        """
+        Retrieve ECEF positions and velocities over time. The velocities are
+        relative to the rotating Earth, as needed for Doppler, range-rate or
+        ground speed
+        
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+        
+        Returns
+        -------
+        ecef : array
             Array of ECEF positions (m, m, m)
+        ecef_vels : array
+            Array of ECEF velocities (m s^-1, m s^-1, m s^-1)
         """
-        self._ensure_converted(times)
-        return self._cache_ecef
+        ecef_vels = self._product(times, "ecef_vels")
+        return self._product(times, "ecef"), ecef_vels
          
     def get_lla(self, times):
         """
@@ -314,13 +1110,12 @@ class Satellite:
         
         Returns
         -------
-        _cache_lla : array
+        lla : array
             Array of ECEF positions (m, m, m)
         """
-        self._ensure_converted(times)
-        return self._cache_lla
+        return self._product(times, "lla")
         
-    def get_gtc(self, times):
+    def get_gtc(self, times, central_meridian = 0.0):
         """
         Retrieve ground track positions over time
         
@@ -328,85 +1123,127 @@ class Satellite:
         ----------
         times : np.array
             Array of timesteps (s)
+        central_meridian = 0.0 : float
+            Longitude at the centre of the map (deg). Tracks are wrapped and
+            broken at central_meridian +/- 180
         
         Returns
         -------
-        _cache_gtc : array
+        gtc : array
             Array of ground track positions (deg, deg)
         """
-        _ = self.get_lla(times)
-        
-        # If gtc has not been previously computed, find gtc
-        if self._cache_gtc is None:
-            lla = self.get_lla(times)
-            lon_dif = np.diff(lla[:,1])
-            breaks = np.where(np.abs(lon_dif) > 180)[0] + 1
-            
-            lon_plot = lla[:,1].copy()
-            lat_plot = lla[:,0].copy()
+        if central_meridian == 0:
+            return self._product(times, "gtc")
+        return frames.ground_track(self.get_lla(times), central_meridian)
             
-            # Make a new array of positions with the ground track positions
-            # which add breaks between large steps in longitudes to avoid
-            # horizontal lines in the ground tracks
-            for idx in reversed(breaks):
-                lon_plot = np.insert(lon_plot, idx, np.nan)
-                lat_plot = np.insert(lat_plot, idx, np.nan)
-                
-            gtc =  np.column_stack([lon_plot, lat_plot])
-            
-            self._cache_gtc = gtc
+    def get_gtc_pyramid(self, times, central_meridian = 0.0):
+        """
+        Retrieve the level of detail pyramid of the ground track, used to
+        plot long tracks with only the visually significant vertices
         
-        return self._cache_gtc
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+        central_meridian = 0.0 : float
+            Longitude at the centre of the map (deg)
+        
+        Returns
+        -------
+        pyramid : decimation.TrackPyramid
+            Multi-resolution ground track
+        """
+        central_meridian = float(central_meridian)
+        pyramids = self._product(times, "gtc_lod")
+        if central_meridian not in pyramids:
+            gtc = self.get_gtc(times, central_meridian)
+            # Only the default meridian in float64 storage returns the cached
+            # ground track itself, any other track is a copy owned by the
+            # pyramid
+            shared = central_meridian == 0 and self._products.storage == "float64"
+            pyramids[central_meridian] = decimation.TrackPyramid(gtc, shared = shared)
+            # Store the container again so that the new pyramid is counted
+            # against the memory budget
+            self._entry(times)["gtc_lod"] = pyramids
+            self._products.trim()
+        return pyramids[central_meridian]
             
-    # Define initial pointing for Satellite based on trajectory and anomaly
+    def set_attitude(self, schedule):
+        """
+        Set the pointing modes of the satellite over time
+        
+        Parameters
+        ----------
+        schedule : attitude.AttitudeMode or list
+            Single mode, or list of (start, mode) pairs where each mode
+            applies from its start (s) until the next one
+        
+        Returns
+        -------
+        """
+        self.attitude = attitude.as_schedule(schedule)
+        
+        def remap(entry):
+            entry.pop("quats", None)
+            entry.pop("attitude_key", None)
+            return entry
+        
+        self._products.remap(remap)
+    
+    # Define pointing for Satellite based on trajectory and attitude schedule
     def _pointing(self, times):
         """
-        Compute nadir pointing reference frame for satellite over time
+        Compute the attitude of the satellite over time, following its
+        attitude schedule
+        
+        Parameters
+        ----------
+        times : np.array
+            Array of timesteps (s)
+        
+        Returns
+        -------
+        entry : dict
+            Products computed on the grid
+        """
+        entry = self._entry(times)
+        
+        # Quaternions are recomputed when a mode depends on state which has
+        # changed since (e.g. the orbit of a tracked satellite)
+        key = attitude.schedule_key(self.attitude)
+        if ("quats" not in entry or "attitude_key" not in entry 
+            or entry["attitude_key"] != key):
+            entry["quats"] = self._compute_quats(times, entry["poses"], entry["vels"])
+            entry["attitude_key"] = key
+            self._products.trim()
+            
+        return entry
+        
+    def _compute_quats(self, times, poses, vels):
+        """
+        Compute attitude quaternions from positions and velocities, each
+        mode of the attitude schedule being evaluated in one batch
         
         Parameters
         ----------
         times : np.array
             Array of timesteps (s)
+        poses : array
+            Array of positions in 3D (m, m, m)
+        vels : array
+            Array of velocities in 3D (m s^-1, m s^-1, m s^-1)
         
         Returns
         -------
+        quats : array
+            Array of attitude quaternions (see attitude)
         """
-        poses = self.propagate(times)
-        vels = self.get_vels(times)
-        quats = np.zeros((len(times), 4))
-        
-        if self._cache_quats is None:
-            for i in range(len(times)):
-                # Calculate the unit vector nadir pointing at t = 0
-                r0 = Vector3D(-float(poses[i,0]),
-                              -float(poses[i,1]),
-                              -float(poses[i,2]))
-                r0_mag = r0.getNorm()
-                b3_unit = r0.scalarMultiply(1/r0_mag)
-                
-                # Calculate the unit vector pointing in direction of motion
-                v0 = Vector3D(float(vels[i,0]),
-                              float(vels[i,1]),
-                              float(vels[i,2]))
-                b1 = v0.subtract(b3_unit.scalarMultiply(v0.dotProduct(b3_unit)))
-                b1_unit = b1.scalarMultiply(1/b1.getNorm())
-                
-                # Calculate remaining third vector
-                b2_unit = b3_unit.crossProduct(b1_unit)
-                
-                # Store vectors in direction cosine matrix from eci to body
-                DCM_b2e = np.array([(b1_unit.x, b1_unit.y, b1_unit.z), 
-                                    (b2_unit.x, b2_unit.y, b2_unit.z), 
-                                    (b3_unit.x, b3_unit.y, b3_unit.z)])
-                
-                quat = R.from_matrix(DCM_b2e).as_quat()
-                quats[i] = quat
-                
-            self._cache_quats = quats
+        return attitude.evaluate(self.attitude, self, times, poses, vels)
         
     def get_quats(self, times):
         """
-        Retrieve quaternions for satellite nadir pointing over time
+        Retrieve quaternions for satellite pointing over time, following the
+        attitude schedule (nadir pointing by default)
         
         Parameters
         ----------
@@ -415,11 +1252,10 @@ class Satellite:
         
         Returns
         -------
-        _cache_quats : array
-            Array of nadir pointing quaternions (m, m, m)
+        quats : array
+            Array of attitude quaternions (see attitude)
         """
-        self._pointing(times)
-        return self._cache_quats
+        return self._pointing(times)["quats"]
 
 #%cd "C:/Users/pelay/OneDrive - University of Bath/Experiences/SuperSharp/Project"
 #cd "C:\Users\pelay\OneDrive - University of Bath\Experiences\SuperSharp\Project"
@@ -1,14 +1,24 @@
 import numpy as np
-from org.hipparchus.geometry.euclidean.threed import Vector3D
-from scipy.spatial.transform import Rotation as R
+import src.model.attitude as attitude
 
 _cross_cache = {}
 
+# Tracking quaternions depend on which satellite observes the other, so their
+# keys keep the (observer, target) order
+_tracking_cache = {}
+
 # Generate times array
 def get_times(duration, timestep):
     times = np.arange(0, duration, timestep)
     return times
 
+def _cross_key(satA, satB, times, tolerance):
+    # Key for the specific satellites, times and tolerance being called, in
+    # either order
+    key_parts = sorted([(id(satA), satA._version),
+                        (id(satB), satB._version)])
+    return (key_parts[0], key_parts[1], times.tobytes(), tolerance)
+
 # Compute distance between two points
 def cross_sat(satA, satB, times, tolerance):
     """
@@ -30,9 +40,7 @@ def cross_sat(satA, satB, times, tolerance):
     -------
     """
     # Find the key for the specific satellites and times being called
-    key_parts = sorted([(id(satA), satA._version),
-                        (id(satB), satB._version)])
-    key = (key_parts[0], key_parts[1], times.tobytes())
+    key = _cross_key(satA, satB, times, tolerance)
     
     # If the key already exists 
     if key not in _cross_cache:
@@ -72,10 +80,7 @@ def get_cross_dist(satA, satB, times, tolerance):
         Distance between both satellites across time (m)
     """
     cross_sat(satA, satB, times, tolerance)
-    key_parts = sorted([(id(satA), satA._version),
-                        (id(satB), satB._version)])
-    key = (key_parts[0], key_parts[1], times.tobytes())
-    cross_sat(satA, satB, times, tolerance)
+    key = _cross_key(satA, satB, times, tolerance)
     return _cross_cache[key][0]
 
 def get_runs(satA, satB, times, tolerance):
@@ -99,22 +104,20 @@ def get_runs(satA, satB, times, tolerance):
         [(start elapsed time 1, end elapsed time 1, duration 1), ...]
     """
     cross_sat(satA, satB, times, tolerance)
-    key_parts = sorted([(id(satA), satA._version),
-                        (id(satB), satB._version)])
-    key = (key_parts[0], key_parts[1], times.tobytes())
-    cross_sat(satA, satB, times, tolerance)
+    key = _cross_key(satA, satB, times, tolerance)
     return _cross_cache[key][1]
 
-def target_pointer(satA, satB, times, tolerance):
+def target_tracking(satA, satB, times, tolerance):
     """
-    Compute pointing for satA observation of satB
+    Compute the attitude of satA tracking satB over every sample of every
+    visibility run, together with the closest approach of each run
     
     Parameters
     ----------
     satA : satellite.Satellite
-        First satellite considered
+        Observer satellite
     satB : satellite.Satellite 
-        Second satellite considered
+        Target satellite
     times : np.array
         Array of timesteps (s)
     tolerance : int
@@ -122,49 +125,69 @@ def target_pointer(satA, satB, times, tolerance):
     
     Returns
     -------
-    quat : float64 array
-        Quaternion for rotation with respect to ECI for satB pointing (from satA)
+    samples : array
+        Indices into times of the samples of all runs, run after run
+    quats : array
+        Tracking quaternions (see attitude) at those samples, shape (S, 4)
+    closest : array
+        Index into times of the closest approach of each run
     """
-    runs = get_runs(satA, satB, times, tolerance)
-    cross_dist = get_cross_dist(satA, satB, times, tolerance)
+    key = ((id(satA), satA._version), (id(satB), satB._version),
+           times.tobytes(), tolerance)
     
-    closest_approach_dist = tolerance
-    if len(runs) != 0:
-        print(runs)
-        closest_approach_time = runs[0][0]
-        for i in range(runs[0][2]):
-            current_dist = cross_dist[runs[0][0]+i]
-            if current_dist < closest_approach_dist:
-                closest_approach_dist = current_dist
-                closest_approach_time = runs[0][0] + i
-                
-        eciA = satA.propagate(times)
-        eciB = satB.propagate(times)
-        
-        observer_pos = eciA[closest_approach_time]
-        target_pos = eciB[closest_approach_time]
-        
-        target_vector = Vector3D(float(target_pos[0] - observer_pos[0]),
-                                 float(target_pos[1] - observer_pos[1]),
-                                 float(target_pos[2] - observer_pos[2]))
-        
-        target_vector_mag = target_vector.getNorm()
-        b3_unit = target_vector.scalarMultiply(1/target_vector_mag)
-        
-        vel = satA.get_vels(times)
-        vec_vel = Vector3D(float(vel[closest_approach_time,0]),
-                           float(vel[closest_approach_time,1]),
-                           float(vel[closest_approach_time,2]))
-        
-        b1 = vec_vel.subtract(b3_unit.scalarMultiply(vec_vel.dotProduct(b3_unit)))
-        b1_unit = b1.scalarMultiply(1/b1.getNorm())
+    if key not in _tracking_cache:
+        runs = get_runs(satA, satB, times, tolerance)
+        cross_dist = get_cross_dist(satA, satB, times, tolerance)[:,0]
         
-        b2_unit = b3_unit.crossProduct(b1_unit)
+        # Samples of every run, flattened
+        starts = np.array([run[0] for run in runs], dtype = int)
+        counts = np.array([run[2] for run in runs], dtype = int)
+        offsets = np.r_[0, np.cumsum(counts)[:-1]].astype(int)
+        owner = np.repeat(np.arange(len(runs)), counts)
+        samples = starts[owner] + np.arange(counts.sum()) - offsets[owner]
         
-        DCM_b2e = np.array([(b1_unit.x, b1_unit.y, b1_unit.z), 
-                            (b2_unit.x, b2_unit.y, b2_unit.z), 
-                            (b3_unit.x, b3_unit.y, b3_unit.z)])
+        # First sample of each run at its minimum distance
+        closest = np.zeros(0, dtype = int)
+        if len(runs):
+            dist = cross_dist[samples]
+            dmin = np.minimum.reduceat(dist, offsets)
+            first = np.flatnonzero(dist == dmin[owner])
+            _, pick = np.unique(owner[first], return_index = True)
+            closest = samples[first[pick]]
         
-        quat = R.from_matrix(DCM_b2e).as_quat()
+        # Boresight towards satB, x-axis along the velocity of satA
+        eciA = satA.propagate(times)[samples]
+        eciB = satB.propagate(times)[samples]
+        vel = satA.get_vels(times)[samples]
+        quats = attitude.boresight_quats(eciB - eciA, vel)
         
-        return quat
+        _tracking_cache[key] = (samples, quats, closest)
+    
+    return _tracking_cache[key]
+
+def target_pointer(satA, satB, times, tolerance):
+    """
+    Compute pointing for satA observation of satB at the closest approach
+    of their first visibility run
+    
+    Parameters
+    ----------
+    satA : satellite.Satellite
+        First satellite considered
+    satB : satellite.Satellite 
+        Second satellite considered
+    times : np.array
+        Array of timesteps (s)
+    tolerance : int
+        Maxmium distance for visibility (m)
+    
+    Returns
+    -------
+    quat : float64 array
+        Quaternion for rotation with respect to ECI for satB pointing (from
+        satA), None if the satellites are never visible
+    """
+    samples, quats, closest = target_tracking(satA, satB, times, tolerance)
+    if len(closest) == 0:
+        return None
+    return quats[np.searchsorted(samples, closest[0])]
@@ -5,6 +5,8 @@ from matplotlib.animation import FuncAnimation
 from pathlib import Path
 from scipy.spatial.transform import Rotation as R
 import src.model.satellite_utils as satellite_utils
+import src.model.fleet as fleet
+import src.model.decimation as decimation
 from cycler import cycler
 
 mpl.rcParams.update({
@@ -22,16 +24,18 @@ my_colors = ['#00FEFC', '#FF2603', '#00FF00', '#FFF01F', '#BF00FF']  # e.g. red,
 # Tell Matplotlib to use this cycle for all plots:
 plt.rcParams['axes.prop_cycle'] = cycler(color=my_colors)
 
-def plot_ground_tracks(sat_names, times):
+def plot_ground_tracks(sat_names, times, central_meridian = 0.0):
     """
     Plot the ground tracks of a set of satellites
     
     Parameters
     ----------
-    sat_names : satellite.Satellite array
+    sat_names : satellite.Satellite array or fleet.SatelliteFleet
         Array of Satellite objects
     times : np.array
         Array of timesteps (s)
+    central_meridian = 0.0 : float
+        Longitude at the centre of the map (deg)
         
     Returns
     -------
@@ -40,6 +44,8 @@ def plot_ground_tracks(sat_names, times):
     ax : axes._axes.Axes
         2D axes configured for ground track plotting
     """
+    sat_names = fleet.as_satellites(sat_names, times)
+    
     fig = plt.figure()
     ax = fig.add_subplot()
     
@@ -47,21 +53,39 @@ def plot_ground_tracks(sat_names, times):
     img_path = project_root / "imgs" / "earth_outline_gray.png"
     earth_map = plt.imread(str(img_path))
     
-    ax.imshow(earth_map, extent=[-180, 180, -90, 90], origin='upper', aspect='equal')
+    # The map is repeated on each side so that any central meridian is
+    # covered, the axis limits then crop it to one turn
+    for offset in (-360, 0, 360):
+        ax.imshow(earth_map, extent=[-180 + offset, 180 + offset, -90, 90], 
+                  origin='upper', aspect='equal')
     
     for spine in ax.spines.values():
         spine.set_edgecolor("#E6E6E6")
     
-    ax.set_xlim([-180, 180])
+    ax.set_xlim([central_meridian - 180, central_meridian + 180])
     ax.set_ylim([-90, 90])
-    ax.set_xticks(np.arange(-180, 181, 60.0))
+    ax.set_xticks(central_meridian + np.arange(-180, 181, 60.0))
     ax.set_yticks(np.arange(-90, 91, 30))
     ax.set_xlabel('Longitude (°)')
     ax.set_ylabel('Latitude (°)')
     
-    for i, sat in enumerate(sat_names):
-        lonlat = sat_names[i].get_gtc(times)
-        ax.plot(lonlat[:,0], lonlat[:,1], label = sat.label)
+    # Only the visually significant vertices are drawn, and the tracks are
+    # refined from their cached pyramids whenever the view changes
+    pyramids = [sat.get_gtc_pyramid(times, central_meridian) for sat in sat_names]
+    lines = []
+    for sat, pyramid in zip(sat_names, pyramids):
+        lonlat = pyramid.points(decimation.view_tolerance(ax))
+        line, = ax.plot(lonlat[:,0], lonlat[:,1], label = sat.label)
+        lines.append(line)
+    
+    def refine(ax):
+        tolerance = decimation.view_tolerance(ax)
+        for line, pyramid in zip(lines, pyramids):
+            lonlat = pyramid.points(tolerance, ax.get_xlim())
+            line.set_data(lonlat[:,0], lonlat[:,1])
+    
+    ax.callbacks.connect('xlim_changed', refine)
+    ax.callbacks.connect('ylim_changed', refine)
     
     ax.legend()
     
@@ -73,7 +97,7 @@ def plot_orbits(sat_names, times):
     
     Parameters
     ----------
-    sat_names : satellite.Satellite array
+    sat_names : satellite.Satellite array or fleet.SatelliteFleet
         Array of Satellite objects
     times : np.array
         Array of timesteps (s)
@@ -85,6 +109,8 @@ def plot_orbits(sat_names, times):
     ax : axes._axes.Axes
         3D axes configured for orbit propagation
     """
+    sat_names = fleet.as_satellites(sat_names, times)
+    
     R_earth = 6.378e6
     n_lon = 59
     n_lat = 30
@@ -133,7 +159,7 @@ def plot_cross_sat(sat_names, times, tolerance):
     
     Parameters
     ----------
-    sat_names : satellite.Satellite array
+    sat_names : satellite.Satellite array or fleet.SatelliteFleet
         Array of Satellite objects
     times : np.array
         Array of timesteps (s)
@@ -147,6 +173,8 @@ def plot_cross_sat(sat_names, times, tolerance):
     ax : axes._axes.Axes
         2D axes configured for distance visualization
     """
+    sat_names = fleet.as_satellites(sat_names, times)
+    
     fig = plt.figure()
     ax = fig.add_subplot(111)
     ax.axhline(y = tolerance, color = 'r', linestyle = '--')
@@ -168,7 +196,7 @@ def animate_sat_attitude(sat_names, times, tolerance, interval = 100, progress_c
     
     Parameters
     ----------
-    sat_names : satellite.Satellite array
+    sat_names : satellite.Satellite array or fleet.SatelliteFleet
         Array of Satellite objects
     times : np.array
         Array of timesteps (s)
@@ -182,6 +210,8 @@ def animate_sat_attitude(sat_names, times, tolerance, interval = 100, progress_c
     anim : animation.FuncAnimation
         Satellite and frame animation
     """
+    sat_names = fleet.as_satellites(sat_names, times)
+    
     #quats = satellite_utils.sat_tracker(sat_names[0], sat_names[1], times, tolerance)
     quats = sat_names[0].get_quats(times)
     rots = R.from_quat(quats)
@@ -0,0 +1,65 @@
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+from src.model.orekit_env import DATA_PACK
+
+"""
+Measure the time to the first ground track with the raw orekit-data-master
+tree and with the data pack, each in a fresh process so that Orekit starts
+with an empty data context
+"""
+project_root = Path(__file__).resolve().parents[2]
+
+_CHILD = """
+import time
+start = time.perf_counter()
+from src.model.orekit_env import setup_orekit_data
+setup_orekit_data(pack = {pack!r})
+from src.model.satellite import Satellite
+import src.model.satellite_utils as satellite_utils
+sat = Satellite(7e6, 0.0, 60, 10, 40, 0, [2020, 1, 1, 0, 0, 0.0], "TRUE")
+sat.get_gtc(satellite_utils.get_times(86400, 60))
+print(time.perf_counter() - start)
+"""
+
+def time_to_first_track(pack, repeats):
+    """
+    Time to the first ground track in fresh processes
+
+    Parameters
+    ----------
+    pack : str or None
+        Data pack to load, None for the raw tree
+    repeats : int
+        Number of processes started
+
+    Returns
+    -------
+    best : float
+        Fastest time measured (s)
+    """
+    code = _CHILD.format(pack = pack)
+    times = []
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, "-c", code], cwd = project_root,
+                                capture_output = True, text = True, check = True)
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare time to first ground "
+                                     "track with the raw data tree and the data pack")
+    parser.add_argument("--pack", default = str(DATA_PACK),
+                        help = "data pack built by build_data_pack.py")
+    parser.add_argument("--repeats", type = int, default = 3,
+                        help = "number of fresh processes per configuration")
+    args = parser.parse_args()
+
+    raw = time_to_first_track(None, args.repeats)
+    packed = time_to_first_track(args.pack, args.repeats)
+    print(f"raw tree:  {raw:.2f} s")
+    print(f"data pack: {packed:.2f} s ({raw / packed:.1f}x faster)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+"""
+Measure startup costs in fresh processes: importing the model and the GUI,
+the runner's --help, and building the first Satellite (which starts the Orekit
+virtual machine and loads its data)
+"""
+project_root = Path(__file__).resolve().parents[2]
+
+CASES = {"import model": ["-c", "import src.model.satellite, src.model.fleet, "
+                          "src.model.visualization"],
+         "import gui": ["-c", "import src.gui.main_window"],
+         "runner --help": ["-m", "src.runner.project_runner", "--help"],
+         "first satellite": ["-c", "from src.model.satellite import Satellite; "
+                             "Satellite(7e6, 0.0, 60, 10, 40, 0, "
+                             "[2020, 1, 1, 0, 0, 0.0], 'TRUE')"]}
+
+def time_case(args, repeats):
+    """
+    Wall time of a Python command in fresh processes
+
+    Parameters
+    ----------
+    args : list
+        Arguments passed to the interpreter
+    repeats : int
+        Number of processes started
+
+    Returns
+    -------
+    best : float or None
+        Fastest time measured (s), None if the command failed (e.g. a
+        missing optional dependency)
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, *args], cwd = project_root,
+                                capture_output = True)
+        if result.returncode != 0:
+            return None
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Measure startup times in "
+                                     "fresh processes")
+    parser.add_argument("--repeats", type = int, default = 3,
+                        help = "number of fresh processes per case")
+    args = parser.parse_args()
+
+    baseline = time_case(["-c", "pass"], args.repeats)
+    print(f"{'interpreter':16s} {baseline:.2f} s")
+    for name, case in CASES.items():
+        elapsed = time_case(case, args.repeats)
+        if elapsed is None:
+            print(f"{name:16s} failed")
+        else:
+            print(f"{name:16s} {elapsed:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import json
+import zipfile
+from pathlib import Path
+from src.model.orekit_env import DATA_PACK, RAW_DATA_DIR as DATA_DIR
+
+"""
+Build a compact Orekit data pack from the raw orekit-data-master tree. Only the
+tables this project loads are kept (leap seconds, EOP, ITRF versions and the
+gravity field used by the "numerical" mode). Orekit only parses the files its
+loaders ask for, so most of the gain comes from trimming the EOP tables: by
+default they start in DEFAULT_START_YEAR, which leaves about a quarter of the
+rows. Entries are stored uncompressed, which Orekit reads without inflating.
+The MJD range of the kept EOP rows is written to the zip comment, so that
+orekit_env can warn about dates outside it. The pack is picked up
+automatically by orekit_env.ensure_vm.
+"""
+RAW_DATA_DIR = DATA_DIR / "orekit-data-master"
+
+PACK_FILES = ("tai-utc.dat",
+              "itrf-versions.conf",
+              "Earth-Orientation-Parameters/IAU-2000/finals2000A.all",
+              "Earth-Orientation-Parameters/IAU-1980/finals.all",
+              "Potential/eigen-6s.gfc")
+
+# Days of EOP kept on each side of the requested years, for interpolation
+EOP_MARGIN_DAYS = 30
+
+# First year of EOP kept unless another range is requested
+DEFAULT_START_YEAR = 2015
+
+def _mjd(year):
+    """
+    Modified Julian Day of the 1st of January of a year
+
+    Parameters
+    ----------
+    year : int
+        Gregorian year
+
+    Returns
+    -------
+    mjd : int
+        Modified Julian Day
+    """
+    y = year - 1
+    return 365 * y + y // 4 - y // 100 + y // 400 - 678575
+
+def trim_finals(text, start_year, end_year):
+    """
+    Keep the lines of an IERS finals table within a range of years
+
+    Parameters
+    ----------
+    text : str
+        Contents of a finals.all or finals2000A.all file
+    start_year : int
+        First year kept
+    end_year : int
+        Last year kept
+
+    Returns
+    -------
+    trimmed : str
+        Contents restricted to the range, plus EOP_MARGIN_DAYS on each side
+    """
+    lo = _mjd(start_year) - EOP_MARGIN_DAYS
+    hi = _mjd(end_year + 1) + EOP_MARGIN_DAYS
+
+    kept = []
+    for line in text.splitlines(keepends = True):
+        # Columns 8-15 hold the MJD of the line
+        try:
+            mjd = float(line[7:15])
+        except ValueError:
+            continue
+        if lo <= mjd <= hi:
+            kept.append(line)
+    return "".join(kept)
+
+def mjd_range(text):
+    """
+    Range of dates covered by an IERS finals table
+
+    Parameters
+    ----------
+    text : str
+        Contents of a finals.all or finals2000A.all file
+
+    Returns
+    -------
+    coverage : tuple or None
+        (first MJD, last MJD), None for an empty table
+    """
+    mjds = []
+    for line in text.splitlines():
+        try:
+            mjds.append(float(line[7:15]))
+        except ValueError:
+            continue
+    if not mjds:
+        return None
+    return min(mjds), max(mjds)
+
+def build_data_pack(source = RAW_DATA_DIR, output = DATA_PACK, 
+                    start_year = DEFAULT_START_YEAR, end_year = None):
+    """
+    Write the data pack
+
+    Parameters
+    ----------
+    source = RAW_DATA_DIR : Path
+        Raw orekit-data-master tree
+    output = DATA_PACK : Path
+        Zip file to write
+    start_year = DEFAULT_START_YEAR : int
+        First year of EOP kept, None to keep the start of the tables
+    end_year = None : int
+        Last year of EOP kept, None to keep the end of the tables
+
+    Returns
+    -------
+    sizes : tuple
+        (bytes of the selected raw files, bytes of the pack)
+    """
+    source, output = Path(source), Path(output)
+    output.parent.mkdir(parents = True, exist_ok = True)
+    trim = start_year is not None or end_year is not None
+
+    raw_bytes = 0
+    coverage = []
+    with zipfile.ZipFile(output, "w", compression = zipfile.ZIP_STORED) as pack:
+        for name in PACK_FILES:
+            path = source / name
+            raw_bytes += path.stat().st_size
+            if name.startswith("Earth-Orientation-Parameters"):
+                text = path.read_text()
+                if trim:
+                    text = trim_finals(text,
+                                       1962 if start_year is None else start_year,
+                                       9999 if end_year is None else end_year)
+                pack.writestr(name, text)
+                coverage.append(mjd_range(text))
+            else:
+                pack.write(path, name)
+        
+        # Dates covered by every EOP table of the pack
+        if None not in coverage:
+            pack.comment = json.dumps({"eop_mjd": [max(lo for lo, _ in coverage),
+                                                   min(hi for _, hi in coverage)]}).encode()
+
+    return raw_bytes, output.stat().st_size
+
+def main():
+    parser = argparse.ArgumentParser(description = "Build a compact Orekit data pack")
+    parser.add_argument("--source", type = Path, default = RAW_DATA_DIR,
+                        help = "raw orekit-data-master tree")
+    parser.add_argument("--output", type = Path, default = DATA_PACK,
+                        help = "zip file to write")
+    parser.add_argument("--start-year", type = int, default = DEFAULT_START_YEAR,
+                        help = "first year of Earth orientation data kept")
+    parser.add_argument("--end-year", type = int, default = None,
+                        help = "last year of Earth orientation data kept")
+    parser.add_argument("--all-years", action = "store_true",
+                        help = "keep the full Earth orientation tables")
+    args = parser.parse_args()
+
+    start_year = None if args.all_years else args.start_year
+    end_year = None if args.all_years else args.end_year
+    raw_bytes, pack_bytes = build_data_pack(args.source, args.output,
+                                            start_year, end_year)
+    print(f"Wrote {args.output} ({pack_bytes / 2**20:.1f} MiB from "
+          f"{raw_bytes / 2**20:.1f} MiB of tables)")
+
+if __name__ == "__main__":
+    main()
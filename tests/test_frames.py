@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+import src.model.frames as frames
+
+"""
+ecef_to_lla must agree with Orekit's OneAxisEllipsoid to well below a
+millimetre, expressed as a distance on the ground for the angles
+"""
+TOLERANCE = 1e-4   # m
+
+def lla_to_ecef(lla):
+    """
+    Convert geodetic coordinates on the WGS84 ellipsoid into ECEF positions
+
+    Parameters
+    ----------
+    lla : array
+        Array of latitude, longitude, altitude, shape (T, 3) (deg, deg, m)
+
+    Returns
+    -------
+    ecef : array
+        Array of ECEF positions, shape (T, 3) (m, m, m)
+    """
+    a = frames.WGS84_EARTH_EQUATORIAL_RADIUS
+    f = frames.WGS84_EARTH_FLATTENING
+    e2 = f * (2 - f)
+    lat, lon, alt = np.deg2rad(lla[:, 0]), np.deg2rad(lla[:, 1]), lla[:, 2]
+    N = a / np.sqrt(1 - e2 * np.sin(lat)**2)
+    return np.column_stack([(N + alt) * np.cos(lat) * np.cos(lon),
+                            (N + alt) * np.cos(lat) * np.sin(lon),
+                            (N * (1 - e2) + alt) * np.sin(lat)])
+
+def sample_lla():
+    # Random points from the surface up to beyond GEO, plus both poles and
+    # the equator
+    rng = np.random.default_rng(0)
+    lla = np.column_stack([rng.uniform(-90, 90, 500),
+                           rng.uniform(-180, 180, 500),
+                           rng.uniform(-1e3, 4.2e7, 500)])
+    special = np.array([[90.0, 0.0, 0.0], [-90.0, 0.0, 0.0],
+                        [90.0, 45.0, 7e5], [-90.0, -120.0, 3.6e7],
+                        [0.0, 0.0, 0.0], [0.0, 179.0, 5e5],
+                        [89.9999, 10.0, 4e5], [-89.9999, -10.0, 4e5]])
+    return np.vstack([lla, special])
+
+def ground_error(lla, expected):
+    # Distance on the ground of the latitude and longitude errors, and the
+    # altitude error (m)
+    a = frames.WGS84_EARTH_EQUATORIAL_RADIUS
+    dlat = np.deg2rad(lla[:, 0] - expected[:, 0])
+    dlon = np.deg2rad((lla[:, 1] - expected[:, 1] + 180) % 360 - 180)
+    dlon *= np.cos(np.deg2rad(expected[:, 0]))
+    return np.max(np.abs(np.column_stack([a * dlat, a * dlon,
+                                          lla[:, 2] - expected[:, 2]])))
+
+def test_round_trip_including_poles():
+    expected = sample_lla()
+    lla = frames.ecef_to_lla(lla_to_ecef(expected))
+    assert ground_error(lla, expected) < TOLERANCE
+
+def test_poles():
+    b = frames.WGS84_EARTH_EQUATORIAL_RADIUS * (1 - frames.WGS84_EARTH_FLATTENING)
+    lla = frames.ecef_to_lla(np.array([[0.0, 0.0, b + 1e3], [0.0, 0.0, -b - 1e3]]))
+    assert np.allclose(lla[:, 0], [90.0, -90.0], rtol = 0, atol = 1e-12)
+    assert np.allclose(lla[:, 2], 1e3, rtol = 0, atol = TOLERANCE)
+
+def test_matches_orekit():
+    pytest.importorskip("orekit")
+    from org.hipparchus.geometry.euclidean.threed import Vector3D
+    from org.orekit.time import AbsoluteDate
+
+    ellipsoid = frames.get_earth_ellipsoid()
+    frame = frames.get_frame("earth_fixed")
+    ecef = lla_to_ecef(sample_lla())
+
+    expected = []
+    for x, y, z in ecef:
+        point = ellipsoid.transform(Vector3D(float(x), float(y), float(z)),
+                                    frame, AbsoluteDate.J2000_EPOCH)
+        expected.append((np.rad2deg(point.getLatitude()),
+                         np.rad2deg(point.getLongitude()),
+                         point.getAltitude()))
+
+    assert ground_error(frames.ecef_to_lla(ecef), np.array(expected)) < TOLERANCE
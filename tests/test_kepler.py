@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+import src.model.kepler as kepler
+
+@pytest.mark.parametrize("e", [0.001, 0.3])
+def test_numpy_matches_orekit(e):
+    pytest.importorskip("orekit")
+    from src.model.satellite import Satellite
+
+    # Three days every minute
+    times = np.arange(0, 3 * 86400 + 1, 60.0)
+    elements = (7.5e6, e, 50, 30, 10, 20, [2020, 1, 1, 0, 0, 0.0], "TRUE")
+    poses, vels = Satellite(*elements, propagation_mode = "numpy")._compute_pv(times)
+    expected_poses, expected_vels = Satellite(
+        *elements, propagation_mode = "orekit")._compute_pv(times)
+
+    position_error = np.linalg.norm(poses - expected_poses, axis = 1)
+    velocity_error = np.linalg.norm(vels - expected_vels, axis = 1)
+    assert np.max(position_error) < kepler.POSITION_TOLERANCE
+    assert np.max(velocity_error) < kepler.VELOCITY_TOLERANCE
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+def make_satellite(**kwargs):
+    pytest.importorskip("orekit")
+    from src.model.satellite import Satellite
+    return Satellite(7e6, 0.001, 50, 0, 10, 1, [2020, 1, 1, 0, 0, 0.0], "TRUE",
+                     **kwargs)
+
+def test_ephemeris_unsorted_grids():
+    # Descending and shuffled grids fall back to the propagator
+    sat = make_satellite(propagation_mode = "numpy", ephemeris_tolerance = 0.01)
+    exact = make_satellite(propagation_mode = "numpy")
+    descending = np.arange(86400, 0, -60.0)
+    shuffled = np.random.default_rng(0).permutation(descending)
+    for times in (descending, shuffled):
+        poses, vels = sat._compute_pv(times)
+        expected_poses, expected_vels = exact._compute_pv(times)
+        assert np.array_equal(poses, expected_poses)
+        assert np.array_equal(vels, expected_vels)